@@ -14,7 +14,8 @@
 # along with this program.  If not, see
 # <http://www.gnu.org/licenses/>.
 
-import six
+import bisect
+import collections
 
 from plexgen import charset
 from plexgen import states
@@ -28,48 +29,54 @@ _repeat_equiv = {
 }
 
 
-class _StateMapper(dict):
+class _ClosureCache(dict):
     """
-    A subclass of ``dict`` to help create states in the target
-    machine.  This is used by ``Machine.copy()``.
+    A subclass of ``dict`` to help compute epsilon closures during
+    subset construction.  This is used by ``Machine.dfa()``.  Keys are
+    either a single state or a ``frozenset`` of the states reached by
+    a transition, and values are the epsilon closures of those states.
+    Closures are interned, so that equal closures are always the same
+    object; dictionaries keyed by closures will then resolve lookups
+    by identity rather than by comparing the contents of the sets.
     """
 
-    def __init__(self, src, dest):
+    def __init__(self):
         """
-        Initialize a ``_StateMapper`` instance.
-
-        :param src: The source machine.
-        :type src: ``Machine``
-        :param dest: The destination machine.
-        :type dest: ``Machine``
+        Initialize a ``_ClosureCache`` instance.
         """
 
-        # Initialize with the machine's start states
-        super(_StateMapper, self).__init__({src._start: dest._start})
+        super(_ClosureCache, self).__init__()
 
-        self.src = src
-        self.dest = dest
+        # The table of interned closures
+        self.interned = {}
 
     def __missing__(self, key):
         """
-        Construct a new destination state on the fly, to correspond to a
-        designated source state.
+        Compute the epsilon closure of a set of states on the fly.
 
-        :param key: The source state to construct a duplicate of.
-        :type key: ``plexgen.states.State``
+        :param key: The state or states to compute the closure of.
+        :type key: ``plexgen.states.State`` or ``frozenset``
 
-        :returns: A new destination state corresponding to the source
-                  state.
-        :rtype: ``plexgen.states.State``
+        :returns: The interned epsilon closure of the states.
+        :rtype: ``frozenset``
         """
 
-        # Construct the new destination state
-        new = self.dest._new_state(key.accepting)
+        # The closure of a set of states is the union of the closures
+        # of its members, which are memoized in turn; the same states
+        # turn up in many different sets during subset construction
+        if isinstance(key, frozenset):
+            closure = frozenset().union(*[self[state] for state in key])
+            closure = self[key] = self.interned.setdefault(closure, closure)
+            return closure
 
-        # Save it to the mapping
-        self[key] = new
+        # Computing the closure of a single state computes the
+        # closures of everything it reaches along the way; save them
+        # all, interned
+        interned = self.interned
+        for state, closure in states.eps_closures((key,), self).items():
+            self[state] = interned.setdefault(closure, closure)
 
-        return new
+        return self[key]
 
 
 class Machine(object):
@@ -80,9 +87,10 @@ class Machine(object):
     basic construction methods, such as ``concat()`` (``+`` operator),
     ``alternate()`` (``|`` operator) and ``repeat()`` (``*``
     operator).  Other methods of note: ``copy()`` creates a deep copy
-    of the machine; ``reverse()`` reverses the machine in place; and
+    of the machine; ``reverse()`` reverses the machine in place;
     ``dfa()`` constructs a new machine that is a deterministic finite
-    automaton.
+    automaton; and ``minimize()`` constructs the minimal equivalent of
+    such a deterministic machine.
     """
 
     def __init__(self, accepting=False, code=None):
@@ -97,7 +105,7 @@ class Machine(object):
         """
 
         # The actual machine
-        self._start = State(accepting, code)
+        self._start = states.State(accepting, code)
         self._accepting = set([self._start] if accepting else [])
         self._states = set([self._start])
 
@@ -130,23 +138,23 @@ class Machine(object):
         # Select the start states to produce; this is a separate
         # method to allow Lexer to override.  The list is ordered, so
         # be careful to maintain the order when producing them...
-        starts = set()
-        for state in self._get_starts():
-            starts.add(state)
-
+        starts = self._get_starts()
+        for state in starts:
             yield state
 
-        # Set up the set of accepting states, not including the start
-        # states, so we can skip them below
-        lasts = self._accepting - starts
-
-        # Produce the remaining states
+        # Produce the middle states in a single pass over the states,
+        # setting aside the accepting states (that are not start
+        # states) to produce last
+        starts = set(starts)
+        accepting = self._accepting
+        lasts = []
         for state in self._states:
-            # Only want the middle states for now
-            if state in starts or state in lasts:
+            if state in starts:
                 continue
-
-            yield state
+            elif state in accepting:
+                lasts.append(state)
+            else:
+                yield state
 
         # Finally, produce the accepting states
         for state in lasts:
@@ -193,7 +201,7 @@ class Machine(object):
         new = self._new_state(self._start.accepting, self._start.code)
 
         # Make sure there's an epsilon transition
-        new.transition(transitions.Epsilon, self._start)
+        new.epsilon_to(self._start)
 
         # Canonicalize the old state
         self._start.accepting = False
@@ -223,7 +231,7 @@ class Machine(object):
         # Create the epsilon transitions from the existing accepting
         # states
         for state in self._accepting:
-            state.transition(transitions.Epsilon, new)
+            state.epsilon_to(new)
 
             # Clear their accepting flag, since they're not accepting
             # states anymore
@@ -236,6 +244,26 @@ class Machine(object):
 
         return new
 
+    def _merge_states(self, other):
+        """
+        Merge the states of another machine into this machine.  The
+        smaller of the two state sets is merged into the larger, which
+        this machine then adopts; this keeps building a machine out of
+        many submachines linear in the total number of states, no
+        matter the order in which they are combined.  The other
+        machine may share its state set with this machine afterwards,
+        and should be discarded after this operation.
+
+        :param other: The other machine.
+        :type other: ``Machine``
+        """
+
+        if len(other._states) > len(self._states):
+            other._states |= self._states
+            self._states = other._states
+        else:
+            self._states |= other._states
+
     def _get_starts(self):
         """
         Retrieve a list of all the start states.
@@ -264,18 +292,18 @@ class Machine(object):
             mach._start.accepting = True
             mach._accepting.add(mach._start)
 
-        # Need to maintain a mapping between our states and the new
-        # machine's states
-        state_map = _StateMapper(self, mach)
-
-        # Duplicate all the transitions
+        # Map all of our states to new states in the new machine in
+        # a single pass
+        state_map = {self._start: mach._start}
         for state in self._states:
+            if state is not self._start:
+                state_map[state] = mach._new_state(state.accepting)
+
+        # Duplicate all the transitions; ours have already been
+        # merged, so the duplicates can be linked in directly
+        for state, new in state_map.items():
             for trans in state.iter_out():
-                state_map[state].transition(
-                    trans.__class__,
-                    state_map[trans.state_in],
-                    **trans.args
-                )
+                new._link(trans.copy(new, state_map[trans.state_in]))
 
         return mach
 
@@ -292,10 +320,14 @@ class Machine(object):
         start = self._start
         final = self._final  # may call _unify_accepting() implicitly
 
-        # Reverse each state and its transitions
+        # Reverse each state and its transitions.  Every transition
+        # appears in the outgoing table of exactly one state, and the
+        # order doesn't matter here, so walk the priority buckets
+        # directly rather than going through the sorted iter_out()
         for state in self._states:
-            for trans in state.iter_out():
-                trans.reverse()
+            for trans_set in state._trans_out.values():
+                for trans in trans_set:
+                    trans.reverse()
             state.reverse()
 
         # Now we have to swap the meaning of the start and final
@@ -307,6 +339,7 @@ class Machine(object):
             final.accepting = False
             start.accepting = True
             self._accepting = set([start])
+            self._final_cache = start
 
             # Now handle the code
             final.code = start.code
@@ -326,52 +359,275 @@ class Machine(object):
         # Create the new machine
         mach = self.__class__()
 
-        # Initialize our state map and our work queue
-        start = states.eps_closure(self._start)
+        # Initialize our closure cache, state map, and work queue
+        closures = _ClosureCache()
+        start = closures[self._start]
         state_map = {start: mach._start}
-        workq = [start]
+        workq = collections.deque([start])
+
+        # The loop below runs once per transition of every state in
+        # every closure, so bind the names it needs locally
+        accepting = self._accepting
+        epsilon = transitions.Epsilon
+        new_state = mach._new_state
+        get_dest = state_map.get
+
+        # An NFA state usually appears in many closures, so flatten
+        # each state's non-epsilon transitions into a list of
+        # (class, transitions) pairs the first time it's seen
+        adjacency = {}
 
         # Make sure to set the machine's start state to be accepting,
         # if necessary
-        if start & self._accepting:
+        if not start.isdisjoint(accepting):
             mach._start.accepting = True
             mach._accepting.add(mach._start)
 
+        # Process the closures in the order they were discovered, so
+        # the DFA states are explored breadth-first
         while workq:
-            state = workq.pop()
+            state = workq.popleft()
+            src = state_map[state]
 
             # Compute the transition table, a dictionary of lists
             # keyed by the transition class
             trans_tab = {}
             for substate in state:
-                for trans in substate.iter_out():
+                adj = adjacency.get(substate)
+                if adj is None:
                     # Skip epsilon transitions; we have those
-                    if isinstance(trans, transitions.Epsilon):
-                        continue
+                    adj = adjacency[substate] = [
+                        (cls, trans_set)
+                        for cls, trans_set in substate.iter_out_by_cls()
+                        if cls is not epsilon and trans_set
+                    ]
 
-                    trans_tab.setdefault(trans.__class__, [])
-                    trans_tab[trans.__class__].append(trans)
+                for cls, trans_set in adj:
+                    trans_tab.setdefault(cls, []).extend(trans_set)
 
             # Build a disjoint transition set
             for cls, trans_list in trans_tab.items():
                 for trans in cls.disjoint(trans_list):
-                    # Assemble the closure of reachable states for
-                    # this disjoint transition
-                    closure = states.eps_closure(*(t.state_in for t in trans))
+                    # Look up the closure of reachable states for this
+                    # disjoint transition; most disjoint transitions
+                    # have a single target, which avoids building a
+                    # set just to use as a key
+                    closure = closures[
+                        trans[0].state_in if len(trans) == 1 else
+                        frozenset(t.state_in for t in trans)
+                    ]
 
                     # Build a new DFA state if necessary
-                    if closure not in state_map:
-                        state_map[closure] = mach._new_state(
-                            closure & self._accepting)
+                    dest = get_dest(closure)
+                    if dest is None:
+                        dest = new_state(not closure.isdisjoint(accepting))
+                        state_map[closure] = dest
                         workq.append(closure)
 
-                    # Add the DFA state transition
-                    state_map[state].transition(
-                        cls, state_map[closure], **trans[0].args
-                    )
+                    # Add the DFA state transition; the disjoint
+                    # transition's arguments have already been
+                    # validated, so just duplicate it
+                    src._add_transition(trans[0].copy(src, dest))
 
         return mach
 
+    def minimize(self):
+        """
+        Construct a minimal deterministic finite automaton equivalent
+        to this machine, using Hopcroft's partition refinement
+        algorithm.  The machine must be deterministic and contain only
+        ``plexgen.transitions.MatchChar`` transitions, such as a
+        ``Matcher`` produced by ``dfa()``.
+
+        :returns: A new machine with the fewest possible states.
+        :rtype: ``Machine``
+
+        :raises TypeError:
+            The machine contains transitions that cannot be minimized.
+        """
+
+        # Gather the transitions, making sure they're all character
+        # matches
+        all_states = list(self)
+        all_trans = []
+        for state in all_states:
+            for trans in state.iter_out():
+                if isinstance(trans, transitions.Epsilon):
+                    raise TypeError('cannot minimize a non-deterministic '
+                                    'finite automaton')
+                elif not isinstance(trans, transitions.MatchChar):
+                    raise TypeError('cannot minimize %s transitions' %
+                                    trans.__class__.__name__)
+                all_trans.append(trans)
+
+        # The alphabet is the set of disjoint ranges of all the
+        # character sets; build the inverse transition function for
+        # each symbol of the alphabet.  The machine may not have a
+        # transition for every symbol from every state; the missing
+        # transitions go to an implicit dead state, represented by
+        # None
+        inverse = []
+        for _dj_cset, indexes in charset.CharSet.disjoint_indexes(
+                *(trans.cset for trans in all_trans)):
+            preimages = {None: set([None])}
+            sources = set()
+            for idx in indexes:
+                trans = all_trans[idx]
+                preimages.setdefault(trans.state_in, set()).add(
+                    trans.state_out)
+                sources.add(trans.state_out)
+            preimages[None].update(
+                state for state in all_states if state not in sources)
+            inverse.append(preimages)
+
+        # The initial partition separates the states by whether they
+        # accept and by their start codes; the dead state goes with
+        # the non-accepting states
+        blocks = []
+        block_of = {}
+        keys = {}
+        for state in all_states + [None]:
+            key = (False, None) if state is None else (state.accepting,
+                                                       state.code)
+            idx = keys.get(key)
+            if idx is None:
+                idx = keys[key] = len(blocks)
+                blocks.append(set())
+            blocks[idx].add(state)
+            block_of[state] = idx
+
+        # Refine the partition.  Every block starts out in the work
+        # set; when a block is split, only the smaller half needs to
+        # be added, unless the block was waiting already
+        waiting = set(range(len(blocks)))
+        while waiting:
+            splitter = list(blocks[waiting.pop()])
+
+            for preimages in inverse:
+                # Find the states leading into the splitter on this
+                # symbol, grouped by the block they're in
+                touched = {}
+                for state in splitter:
+                    for source in preimages.get(state, ()):
+                        touched.setdefault(block_of[source], set()).add(
+                            source)
+
+                # Split the blocks that are only partly covered
+                for idx, inside in touched.items():
+                    block = blocks[idx]
+                    if len(inside) == len(block):
+                        continue
+
+                    block -= inside
+                    new_idx = len(blocks)
+                    blocks.append(inside)
+                    for state in inside:
+                        block_of[state] = new_idx
+
+                    if idx in waiting or len(inside) < len(block):
+                        waiting.add(new_idx)
+                    else:
+                        waiting.add(idx)
+
+        # Construct the new machine, with a state for each block.
+        # States equivalent to the dead state can never reach an
+        # accepting state, so they're dropped, along with any
+        # transitions to them
+        mach = self.__class__()
+        dead = block_of[None]
+        start = block_of[self._start]
+        mach._start.code = self._start.code
+        if self._start.accepting:
+            mach._start.accepting = True
+            mach._accepting.add(mach._start)
+        reps = [next((state for state in block if state is not None), None)
+                for block in blocks]
+        state_map = {start: mach._start}
+        for idx, rep in enumerate(reps):
+            if idx != dead and idx != start:
+                state_map[idx] = mach._new_state(rep.accepting)
+
+        # Copy the transitions of one state from each block, mapping
+        # the target states to their blocks; transitions to the same
+        # block are merged as they're added
+        for idx, new in state_map.items():
+            for trans in reps[idx].iter_out():
+                dest = block_of[trans.state_in]
+                if dest != dead:
+                    new._add_transition(trans.copy(new, state_map[dest]))
+
+        return mach
+
+    def compile(self):
+        """
+        Compile this machine into a Python function that matches
+        strings.  Rather than interpreting the machine's transitions,
+        the function hard-codes the transition table as a chain of
+        integer range checks for each state.  The machine must be
+        deterministic and contain only
+        ``plexgen.transitions.MatchChar`` transitions, such as a
+        ``Matcher`` produced by ``dfa()``.
+
+        :returns: A function that takes a string and returns ``True``
+                  if the machine accepts the entire string.
+
+        :raises TypeError:
+            The machine contains transitions that cannot be compiled.
+        """
+
+        # Number the states; the start state must be 0
+        numbers = dict((state, i) for i, state in enumerate(self))
+
+        # Generate the body of the match loop
+        lines = [
+            'def match(string):',
+            '    st = 0',
+            '    for c in string:',
+            '        c = ord(c)',
+        ]
+        for state, num in sorted(numbers.items(), key=lambda x: x[1]):
+            lines.append('        %s st == %d:' %
+                         ('if' if num == 0 else 'elif', num))
+
+            # Generate a range check for each range of each transition
+            kw = 'if'
+            for trans in state.iter_out():
+                if isinstance(trans, transitions.Epsilon):
+                    raise TypeError('cannot compile a non-deterministic '
+                                    'finite automaton')
+                elif not isinstance(trans, transitions.MatchChar):
+                    raise TypeError('cannot compile %s transitions' %
+                                    trans.__class__.__name__)
+
+                for rng in trans.cset.ranges:
+                    if rng.start == rng.end:
+                        lines.append('            %s c == %#x:' %
+                                     (kw, rng.start))
+                    else:
+                        lines.append('            %s %#x <= c <= %#x:' %
+                                     (kw, rng.start, rng.end))
+                    lines.append('                st = %d' %
+                                 numbers[trans.state_in])
+                    kw = 'elif'
+
+            # No match means the string is rejected
+            if kw == 'if':
+                lines.append('            return False')
+            else:
+                lines.append('            else:')
+                lines.append('                return False')
+        lines.append('    return st in accepting')
+
+        # Compile the function
+        namespace = {
+            'accepting': frozenset(numbers[state]
+                                   for state in self._accepting),
+        }
+        exec(compile('\n'.join(lines) + '\n', '<plexgen>', 'exec'),
+             namespace)
+
+        return namespace['match']
+
     @property
     def _final(self):
         """
@@ -392,7 +648,7 @@ class Machine(object):
 
             else:
                 # Exactly one accepting state
-                self._final_cache = list(self._accepting)[0]
+                self._final_cache = next(iter(self._accepting))
 
         return self._final_cache
 
@@ -456,10 +712,14 @@ class Matcher(Machine):
         last_state = mach._start
         for i, char in enumerate(string):
             state = mach._new_state(i == len(string) - 1)
-            last_state.transition(transitions.MatchChar, final,
+            last_state.transition(transitions.MatchChar, state,
                                   cset=charset.CharSet(char))
             last_state = state
 
+        # The last state is the final state
+        if string:
+            mach._final_cache = last_state
+
         return mach
 
     def __init__(self):
@@ -605,6 +865,45 @@ class Matcher(Machine):
         except TypeError:
             return NotImplemented
 
+    def _concat_many(self, machs):
+        """
+        Concatenates a sequence of machines to this machine, in order.
+        This is equivalent to calling ``concat()`` with each machine
+        in turn, but stitches the whole chain together in a single
+        pass, resolving each final state only once.  The other
+        machines will be altered and should be discarded after this
+        operation.
+
+        :param list machs: A list of ``Matcher`` instances to
+                           concatenate.
+
+        :returns: A concatenated machine.
+        :rtype: ``Matcher``
+        """
+
+        # Nothing to do if there are no machines
+        if not machs:
+            return self
+
+        # Link each final state to the start state of the next machine
+        final = self._final
+        for mach in machs:
+            # Merge the state sets
+            self._merge_states(mach)
+
+            # Add an epsilon transition from the current final state
+            # to the machine's start state; the final state is no
+            # longer accepting
+            final.epsilon_to(mach._start)
+            final.accepting = False
+            final = mach._final
+
+        # Update the accepting states from the last machine
+        self._accepting = machs[-1]._accepting
+        self._final_cache = final
+
+        return self
+
     def concat(self, other):
         """
         Concatenates another machine to this machine.  The other machine
@@ -623,16 +922,18 @@ class Matcher(Machine):
                             other.__class__.__name__)
 
         # Merge the state sets
-        self._states |= other._states
+        self._merge_states(other)
 
         # Add an epsilon transition from our current final state to
         # the other machine's start state
-        self._final.transition(transitions.Epsilon, other._start)
+        final = self._final
+        final.epsilon_to(other._start)
 
-        # Update the accepting states
-        self._final.accepting = False
+        # Update the accepting states; the other machine's cached
+        # _final remains valid for its accepting states
+        final.accepting = False
         self._accepting = other._accepting
-        self._final_cache = None  # invalidate cached _final
+        self._final_cache = other._final_cache
 
         return self
 
@@ -663,12 +964,12 @@ class Matcher(Machine):
             self._unify_accepting()
 
         # Merge the state sets
-        self._states |= other._states
+        self._merge_states(other)
 
         # Add epsilon transitions from our start state to the other
         # machine's start state, and similarly for the final state
-        self._start.transition(Epsilon, other._start)
-        other._final.transition(Epsilon, self._final)
+        self._start.epsilon_to(other._start)
+        other._final.epsilon_to(self._final)
 
         # Make sure to clear the accepting flag on the other machine's
         # final state
@@ -697,14 +998,19 @@ class Matcher(Machine):
         :rtype: ``Matcher``
         """
 
-        # Canonicalize other
-        if isinstance(other, six.integer_types):
+        # Canonicalize other; the checks are ordered from the most to
+        # the least common
+        if isinstance(other, int):
             # Single integer is equivalent to (n, n)
             min_cnt = other
             max_cnt = other
-        elif other in _match_equiv:
+        elif isinstance(other, str):
             # One of the special repeat operators
-            min_cnt, max_cnt = _repeat_equiv[other]
+            bounds = _repeat_equiv.get(other)
+            if bounds is None:
+                raise TypeError('cannot understand repeat instruction %r' %
+                                other)
+            min_cnt, max_cnt = bounds
         elif isinstance(other, (list, tuple)) and len(other) == 2:
             # Tuple of (lower bound, upper bound)
             min_cnt, max_cnt = other
@@ -714,12 +1020,12 @@ class Matcher(Machine):
                 min_cnt = 0
 
             # Sanity-check the min count
-            if not isinstance(min_cnt, six.integer_types) or min_cnt < 0:
+            if not isinstance(min_cnt, int) or min_cnt < 0:
                 raise ValueError('invalid lower bound %r' % min_cnt)
 
             # Sanity-check the max count
             if (max_cnt is not None and
-                    (not isinstance(max_cnt, six.integer_types) or
+                    (not isinstance(max_cnt, int) or
                      max_cnt < min_cnt)):
                 raise ValueError('invalid upper bound %r' % max_cnt)
         else:
@@ -742,7 +1048,7 @@ class Matcher(Machine):
             # If it's the last machine and we have an open interval,
             # make it repeat
             if i == len(machs) - 1 and max_cnt is None:
-                mach._final.transition(transitions.Epsilon, mach._start)
+                mach._final.epsilon_to(mach._start)
 
             # If it's an optional machine, make it optional
             if i >= min_cnt:
@@ -754,13 +1060,10 @@ class Matcher(Machine):
                          else mach._unify_accepting())
 
                 # Add the transition that makes it optional
-                start.transition(transitions.Epsilon, final)
-
-            # Finally, concatenate the machine
-            if mach is not self:
-                self.concat(mach)
+                start.epsilon_to(final)
 
-        return self
+        # Finally, concatenate the copies in one pass
+        return self._concat_many(machs[1:])
 
 
 class Lexer(Machine):
@@ -779,8 +1082,10 @@ class Lexer(Machine):
         # Initialize superclass
         super(Lexer, self).__init__(True, '')
 
-        # Set up the index of start codes
+        # Set up the index of start codes, along with a sorted list
+        # of the codes
         self._start_codes = {'': self._start}
+        self._sorted_codes = ['']
 
     def _get_start_by_code(self, code):
         """
@@ -796,6 +1101,7 @@ class Lexer(Machine):
         if code not in self._start_codes:
             # Have to create a new one
             self._start_codes[code] = self._new_state(True, code)
+            bisect.insort(self._sorted_codes, code)
 
         return self._start_codes[code]
 
@@ -808,8 +1114,7 @@ class Lexer(Machine):
         :rtype: ``list``
         """
 
-        return [state for code, state in
-                sorted(self._start_codes.items(), key=lambda x: x[0])]
+        return [self._start_codes[code] for code in self._sorted_codes]
 
     def action(self, mach, action, precedence, code='', exit_code=None,
                name=None):
@@ -842,7 +1147,7 @@ class Lexer(Machine):
         """
 
         # Add the machine states
-        self._states |= mach._states
+        self._merge_states(mach)
 
         # Pick the correct start nodes
         start = self._get_start_by_code(code)
@@ -850,7 +1155,7 @@ class Lexer(Machine):
                  else self._get_start_by_code(exit_code))
 
         # Add an epsilon transition from the start state
-        start.transition(transitions.Epsilon, mach._start)
+        start.epsilon_to(mach._start)
 
         # Add an action transition from the machine's final state to
         # the designated start state
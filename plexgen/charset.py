@@ -15,11 +15,13 @@
 # <http://www.gnu.org/licenses/>.
 
 import abc
+import bisect
 import collections
-
-import six
-
-from plexgen import prioq
+import collections.abc
+import functools
+import itertools
+import operator
+import weakref
 
 
 # Character range constants
@@ -44,9 +46,20 @@ SUBSTITUTE = {  # Substitutions
 }
 
 
-# Representation of a character range
+# Representation of a character range.  The field names are for
+# the convenience of callers; the range algebra in this module
+# unpacks or indexes ranges as plain tuples, which is considerably
+# cheaper than the namedtuple attribute lookups
 Range = collections.namedtuple('Range', ['start', 'end'])
 
+# Cache of live FrozenCharSet instances, for FrozenCharSet.intern()
+_frozen_cache = weakref.WeakValueDictionary()
+
+# Construct a Range from a (start, end) tuple.  This bypasses the
+# argument handling of the namedtuple constructor, which is a
+# significant cost given how many ranges the range algebra creates
+_make_range = functools.partial(tuple.__new__, Range)
+
 
 def _vchars(*chars):
     """
@@ -74,12 +87,31 @@ def _qchar(char):
     :rtype: ``str``
     """
 
+    # ASCII characters are looked up in a precomputed table
+    if 0 <= char < 0x80:
+        return _QCHAR_ASCII[char]
+
+    return _qchar_compute(char)
+
+
+def _qchar_compute(char):
+    """
+    Quotes a character for display, without consulting the table of
+    precomputed ASCII display strings.
+
+    :param int char: The character to quote, expressed as a code
+                     point.
+
+    :returns: The display string for the character.
+    :rtype: ``str``
+    """
+
     # If it's in the graphical range, use it directly (possibly with
     # escaping)
     if MIN_GRAPH <= char <= MAX_GRAPH:
         if char in ESCAPED:
-            return u'\\%s' % six.unichr(char)
-        return six.unichr(char)
+            return u'\\%s' % chr(char)
+        return chr(char)
 
     # If it has a substitution, use that
     elif char in SUBSTITUTE:
@@ -93,6 +125,10 @@ def _qchar(char):
     return u'\\U%08x' % char
 
 
+# Precomputed display strings for the ASCII characters
+_QCHAR_ASCII = tuple(_qchar_compute(c) for c in range(0x80))
+
+
 def _rngstr(rng):
     """
     Produce a proper representation of a range.
@@ -104,21 +140,67 @@ def _rngstr(rng):
     :rtype: ``str``
     """
 
-    if rng.start == rng.end:
+    start, end = rng
+
+    if start == end:
         # Single-character range
-        return _qchar(rng.start)
-    elif rng.start == rng.end - 1:
+        return _qchar(start)
+    elif start == end - 1:
         # Two-character range
-        return u'%s%s' % (_qchar(rng.start), _qchar(rng.end))
+        return u'%s%s' % (_qchar(start), _qchar(end))
 
     # Longer range
-    return u'%s-%s' % (_qchar(rng.start), _qchar(rng.end))
+    return u'%s-%s' % (_qchar(start), _qchar(end))
+
+
+def _from_chars(chars):
+    """
+    Construct a range list from an iterable of characters.  The
+    characters are sorted once and coalesced into ranges in a single
+    pass, rather than being inserted into the range list one at a
+    time.
+
+    :param chars: An iterable of characters.  Each character may be
+                  either a 1-character string or an integer.
+
+    :returns: The range list.
+    :rtype: ``list``
+
+    :raises ValueError:
+        One of the input integers was outside the valid range.
+    """
+
+    # Convert all the characters to integers
+    codes = set()
+    for char in chars:
+        if isinstance(char, str):
+            char = ord(char)
+        else:
+            _vchars(char)
+        codes.add(char)
+
+    # Coalesce them into ranges
+    ranges = []
+    start = end = None
+    for code in sorted(codes):
+        if end is not None and code == end + 1:
+            end = code
+            continue
+
+        if end is not None:
+            ranges.append(_make_range((start, end)))
+        start = end = code
+    if end is not None:
+        ranges.append(_make_range((start, end)))
+
+    return ranges
 
 
 def _search_ranges(ranges, item, lo=0, hi=None):
     """
     Search the ``ranges`` list for the given item.  This is
-    implemented using a binary search.
+    implemented using a binary search, courtesy of the standard
+    ``bisect`` module.
 
     :param list ranges: A sorted list of ``Range`` instances to
                         search.
@@ -135,10 +217,6 @@ def _search_ranges(ranges, item, lo=0, hi=None):
               found.
     """
 
-    # Note: Adapted from standard Python "bisect" library, but
-    # with additions due to the fact that we're storing ranges of
-    # items, not the items themselves.
-
     # Sanity-check and normalize the bisection variables
     if hi is None:
         hi = len(ranges)
@@ -147,28 +225,16 @@ def _search_ranges(ranges, item, lo=0, hi=None):
     if hi > len(ranges):
         raise IndexError('hi out of range')
 
-    # If there are no ranges, we have our answer
-    if not ranges[lo:hi]:
-        return lo, False
-
-    while lo < hi:
-        mid = (lo + hi) // 2
+    # Find the first range starting after the item.  Ranges compare
+    # as tuples, and the key sorts after any range starting at the
+    # item itself, so the only range that can contain the item is
+    # the one just before
+    idx = bisect.bisect_right(ranges, (item, MAX_CHAR + 1), lo, hi)
+    if idx > lo and ranges[idx - 1][1] >= item:
+        return idx - 1, True
 
-        if ranges[mid].start <= item <= ranges[mid].end:
-            # Item is contained in a range at the midpoint
-            return mid, True
-
-        elif item < ranges[mid].start:
-            # Item is to the left
-            hi = mid
-
-        else:
-            # Item is to the right
-            lo = mid + 1
-
-    # Never hit a range containing the item, so return insertion
-    # point
-    return lo, False
+    # No range contains the item, so return the insertion point
+    return idx, False
 
 
 def _add_range(ranges, start, end, start_hint=None, end_hint=None):
@@ -193,6 +259,12 @@ def _add_range(ranges, start, end, start_hint=None, end_hint=None):
     :rtype: ``list``
     """
 
+    # Ranges are frequently added in ascending order, so handle
+    # ranges falling strictly after the last range without searching
+    if start_hint is None and (not ranges or start > ranges[-1][1] + 1):
+        ranges.append(_make_range((start, end)))
+        return ranges
+
     start_idx, start_contained = (_search_ranges(ranges, start)
                                   if start_hint is None else start_hint)
     end_idx, end_contained = (_search_ranges(ranges, end, start_idx)
@@ -204,21 +276,21 @@ def _add_range(ranges, start, end, start_hint=None, end_hint=None):
 
     # Figure out the start point and end point of the new range
     if start_contained:
-        start = ranges[start_idx].start
+        start = ranges[start_idx][0]
     if end_contained:
-        end = ranges[end_idx].end
+        end = ranges[end_idx][1]
         end_idx += 1
 
     # Check for range merge
-    if start_idx > 0 and ranges[start_idx - 1].end + 1 == start:
+    if start_idx > 0 and ranges[start_idx - 1][1] + 1 == start:
         start_idx -= 1
-        start = ranges[start_idx].start
-    if end_idx < len(ranges) and ranges[end_idx].start == end + 1:
-        end = ranges[end_idx].end
+        start = ranges[start_idx][0]
+    if end_idx < len(ranges) and ranges[end_idx][0] == end + 1:
+        end = ranges[end_idx][1]
         end_idx += 1
 
     # Update the ranges list
-    ranges[start_idx:end_idx] = [Range(start, end)]
+    ranges[start_idx:end_idx] = [_make_range((start, end))]
 
     return ranges
 
@@ -245,6 +317,12 @@ def _discard_range(ranges, start, end, start_hint=None, end_hint=None):
     :rtype: ``list``
     """
 
+    # Nothing to do if the range falls entirely outside the ranges;
+    # this avoids searching when removing ranges in bulk
+    if start_hint is None and (not ranges or start > ranges[-1][1] or
+                               end < ranges[0][0]):
+        return ranges
+
     start_idx, start_contained = (_search_ranges(ranges, start)
                                   if start_hint is None else start_hint)
     end_idx, end_contained = (_search_ranges(ranges, end, start_idx)
@@ -257,11 +335,13 @@ def _discard_range(ranges, start, end, start_hint=None, end_hint=None):
     # Compute the replacement ranges
     repl = []
     if start_contained:
-        if ranges[start_idx].start != start:
-            repl.append(Range(ranges[start_idx].start, start - 1))
+        rng_start = ranges[start_idx][0]
+        if rng_start != start:
+            repl.append(_make_range((rng_start, start - 1)))
     if end_contained:
-        if ranges[end_idx].end != end:
-            repl.append(Range(end + 1, ranges[end_idx].end))
+        rng_end = ranges[end_idx][1]
+        if rng_end != end:
+            repl.append(_make_range((end + 1, rng_end)))
         end_idx += 1
 
     # Update the ranges list
@@ -270,35 +350,133 @@ def _discard_range(ranges, start, end, start_hint=None, end_hint=None):
     return ranges
 
 
+def _clip(ranges, start, end):
+    """
+    Construct the intersection of a range list with a single range.
+
+    :param ranges: The range list.
+    :param int start: The starting point of the range.
+    :param int end: The ending point of the range.
+
+    :returns: The portion of ``ranges`` falling between ``start`` and
+              ``end``, inclusive.
+    :rtype: ``list``
+    """
+
+    start_idx, _contained = _search_ranges(ranges, start)
+    end_idx, contained = _search_ranges(ranges, end, start_idx)
+    if contained:
+        end_idx += 1
+
+    # Trim the ranges at either end of the slice
+    result = list(ranges[start_idx:end_idx])
+    if result:
+        if result[0][0] < start:
+            result[0] = _make_range((start, result[0][1]))
+        if result[-1][1] > end:
+            result[-1] = _make_range((result[-1][0], end))
+
+    return result
+
+
 def _invert(ranges):
     """
-    Return an iterator of the character ranges excluded by a given
-    range.
+    Construct a list of the character ranges excluded by a given range
+    list.
 
     :param list ranges: The range list to invert.
 
-    :returns: A generator producing ``Range`` instances.
+    :returns: The inverted range list.
+    :rtype: ``list``
     """
 
-    # Start off configured to exclude the whole range
+    result = []
+
+    # Each excluded range runs from just past the end of one range to
+    # just before the start of the next
     start = MIN_CHAR
-    end = MAX_CHAR
+    for rng_start, rng_end in ranges:
+        if start < rng_start:
+            result.append(_make_range((start, rng_start - 1)))
+        start = rng_end + 1
 
-    # Walk through the ranges
-    for rng in ranges:
-        # Update the end of the excluded range
-        end = rng.start - 1
-        if start <= end:
-            # We have a valid range, yield it
-            yield Range(start, end)
+    # Add the last range
+    if start <= MAX_CHAR:
+        result.append(_make_range((start, MAX_CHAR)))
 
-        # Reset for the next interval
-        start = rng.end + 1
-        end = MAX_CHAR
+    return result
 
-    if start <= end:
-        # Yield the last range
-        yield Range(start, end)
+
+def _merge(ranges1, ranges2, op):
+    """
+    Combine two range lists in a single pass.  This walks the
+    boundaries of the ranges in both lists in ascending order, and
+    includes in the result each stretch of characters for which
+    ``op`` returns a ``True`` value.
+
+    :param list ranges1: The first range list.
+    :param list ranges2: The second range list.
+    :param op: A callable taking two booleans, indicating whether a
+               stretch of characters is contained in ``ranges1`` and
+               ``ranges2``, respectively, and returning a boolean
+               indicating whether the stretch should be included in
+               the result.  It must return ``False`` when passed two
+               ``False`` values.
+
+    :returns: The combined range list.
+    :rtype: ``list``
+    """
+
+    result = []
+    len1 = len(ranges1)
+    len2 = len(ranges2)
+    idx1 = idx2 = 0
+    in1 = in2 = False
+    start = None
+
+    # Each list's next boundary is the start of its next range, if
+    # we're outside a range, or just past the end of the current
+    # range, if we're inside one
+    while idx1 < len1 and idx2 < len2:
+        bound1 = ranges1[idx1][1] + 1 if in1 else ranges1[idx1][0]
+        bound2 = ranges2[idx2][1] + 1 if in2 else ranges2[idx2][0]
+        pos = min(bound1, bound2)
+
+        # Cross the boundaries at this position
+        if bound1 == pos:
+            if in1:
+                idx1 += 1
+            in1 = not in1
+        if bound2 == pos:
+            if in2:
+                idx2 += 1
+            in2 = not in2
+
+        # Open or close a range in the result.  Ranges only ever
+        # close at one boundary and open at a later one, so they are
+        # never adjacent
+        if op(in1, in2):
+            if start is None:
+                start = pos
+        elif start is not None:
+            result.append(_make_range((start, pos - 1)))
+            start = None
+
+    # Once one list is exhausted, the rest of the result is either
+    # the remainder of the other list or nothing at all, so copy it
+    # across wholesale
+    if idx1 < len1:
+        rest, idx, inside, flags = ranges1, idx1, in1, (True, False)
+    else:
+        rest, idx, inside, flags = ranges2, idx2, in2, (False, True)
+    if idx < len(rest) and op(*flags):
+        if inside:
+            # Close the range left open by the main loop
+            result.append(_make_range((start, rest[idx][1])))
+            idx += 1
+        result.extend(rest[idx:])
+
+    return result
 
 
 def _intersection(ranges1, ranges2):
@@ -312,18 +490,43 @@ def _intersection(ranges1, ranges2):
     :rtype: ``list``
     """
 
-    # Arrange for ranges1 to be the longest list
-    if len(ranges1) < len(ranges2):
-        ranges1, ranges2 = ranges2, ranges1
-
-    # Copy the list (or tuple)
-    ranges1 = list(ranges1)
+    # Short cut the case where the lists don't overlap at all
+    if (not ranges1 or not ranges2 or ranges1[-1][1] < ranges2[0][0] or
+            ranges2[-1][1] < ranges1[0][0]):
+        return []
+
+    # Intersecting with a single range, such as [a-z], takes only a
+    # pair of searches
+    if len(ranges2) == 1:
+        return _clip(ranges1, *ranges2[0])
+    elif len(ranges1) == 1:
+        return _clip(ranges2, *ranges1[0])
+
+    result = []
+    len1 = len(ranges1)
+    len2 = len(ranges2)
+    idx1 = idx2 = 0
+
+    # Walk both lists in step, emitting the overlap of the current
+    # pair of ranges, if any, and then advancing past whichever
+    # range ends first.  The ranges within each list never adjoin,
+    # so neither do the overlaps
+    while idx1 < len1 and idx2 < len2:
+        start1, end1 = ranges1[idx1]
+        start2, end2 = ranges2[idx2]
+
+        start = start1 if start1 > start2 else start2
+        if end1 < end2:
+            end = end1
+            idx1 += 1
+        else:
+            end = end2
+            idx2 += 1
 
-    # Remove elements from the inverse
-    for rng in _invert(ranges2):
-        _discard_range(ranges1, rng.start, rng.end)
+        if start <= end:
+            result.append(_make_range((start, end)))
 
-    return ranges1
+    return result
 
 
 def _union(ranges1, ranges2):
@@ -337,18 +540,64 @@ def _union(ranges1, ranges2):
     :rtype: ``list``
     """
 
-    # Arrange for ranges1 to be the longest list
-    if len(ranges1) < len(ranges2):
-        ranges1, ranges2 = ranges2, ranges1
-
-    # Copy the list (or tuple)
-    ranges1 = list(ranges1)
-
-    # Add elements from the other ranges list
-    for rng in ranges2:
-        _add_range(ranges1, rng.start, rng.end)
-
-    return ranges1
+    # Short cut the cases where one list lies entirely before the
+    # other, with a gap between them; the lists can simply be joined
+    if not ranges1 or not ranges2 or ranges1[-1][1] + 1 < ranges2[0][0]:
+        result = list(ranges1)
+        result.extend(ranges2)
+        return result
+    elif ranges2[-1][1] + 1 < ranges1[0][0]:
+        result = list(ranges2)
+        result.extend(ranges1)
+        return result
+
+    # Adding a single range takes only a pair of searches
+    if len(ranges2) == 1:
+        return _add_range(list(ranges1), *ranges2[0])
+    elif len(ranges1) == 1:
+        return _add_range(list(ranges2), *ranges1[0])
+
+    result = []
+    len1 = len(ranges1)
+    len2 = len(ranges2)
+    idx1 = idx2 = 0
+    start = end = None
+
+    # Walk both lists in order of range start, extending the current
+    # range for as long as the next one overlaps or adjoins it
+    while idx1 < len1 and idx2 < len2:
+        if ranges1[idx1][0] <= ranges2[idx2][0]:
+            rng_start, rng_end = ranges1[idx1]
+            idx1 += 1
+        else:
+            rng_start, rng_end = ranges2[idx2]
+            idx2 += 1
+
+        if end is not None and rng_start <= end + 1:
+            if rng_end > end:
+                end = rng_end
+            continue
+
+        if end is not None:
+            result.append(_make_range((start, end)))
+        start, end = rng_start, rng_end
+
+    # Once one list is exhausted, only the first few remaining ranges
+    # of the other can touch the current range; the rest are copied
+    # across wholesale.  Both lists are non-empty, so the loop above
+    # has always opened a range
+    if idx1 < len1:
+        rest, idx, count = ranges1, idx1, len1
+    else:
+        rest, idx, count = ranges2, idx2, len2
+    while idx < count and rest[idx][0] <= end + 1:
+        if rest[idx][1] > end:
+            end = rest[idx][1]
+        idx += 1
+    result.append(_make_range((start, end)))
+    result.extend(rest[idx:])
+
+    return result
 
 
 def _difference(ranges1, ranges2):
@@ -363,14 +612,43 @@ def _difference(ranges1, ranges2):
     :rtype: ``list``
     """
 
-    # Copy the list (or tuple)
-    ranges1 = list(ranges1)
+    # Short cut the case where the lists don't overlap at all
+    if (not ranges1 or not ranges2 or ranges1[-1][1] < ranges2[0][0] or
+            ranges2[-1][1] < ranges1[0][0]):
+        return list(ranges1)
+
+    # Removing a single range takes only a pair of searches
+    if len(ranges2) == 1:
+        return _discard_range(list(ranges1), *ranges2[0])
+
+    result = []
+    len2 = len(ranges2)
+    idx2 = 0
+
+    # Carve the ranges of the second list out of each range of the
+    # first in turn
+    for start, end in ranges1:
+        # Skip the ranges that end before this one starts
+        while idx2 < len2 and ranges2[idx2][1] < start:
+            idx2 += 1
+
+        # Emit the stretches between the ranges that overlap this one
+        while idx2 < len2 and ranges2[idx2][0] <= end:
+            sub_start, sub_end = ranges2[idx2]
+            if sub_start > start:
+                result.append(_make_range((start, sub_start - 1)))
+            if sub_end >= end:
+                # The rest of this range is removed; the range that
+                # removed it may also overlap the next one
+                start = end + 1
+                break
+            start = sub_end + 1
+            idx2 += 1
 
-    # Remove elements from the other ranges list
-    for rng in ranges2:
-        _discard_range(ranges1, rng.start, rng.end)
+        if start <= end:
+            result.append(_make_range((start, end)))
 
-    return ranges1
+    return result
 
 
 def _sym_difference(ranges1, ranges2):
@@ -385,18 +663,12 @@ def _sym_difference(ranges1, ranges2):
     :rtype: ``list``
     """
 
-    # Compute intermediate ranges; this is equivalent to computing
-    # tmp1=(ranges1 & ~ranges2) and tmp2=(ranges2 & ~ranges1), but
-    # avoids a double call to _invert()
-    tmp1 = list(ranges1)
-    tmp2 = list(ranges2)
-    for rng in ranges2:
-        _discard_range(tmp1, rng.start, rng.end)
-    for rng in ranges1:
-        _discard_range(tmp2, rng.start, rng.end)
+    # If the lists don't overlap at all, this is just their union
+    if (not ranges1 or not ranges2 or ranges1[-1][1] < ranges2[0][0] or
+            ranges2[-1][1] < ranges1[0][0]):
+        return _union(ranges1, ranges2)
 
-    # Now just need the union of those two sets of ranges
-    return _union(tmp1, tmp2)
+    return _merge(ranges1, ranges2, operator.xor)
 
 
 def _isdisjoint(ranges1, ranges2):
@@ -410,25 +682,27 @@ def _isdisjoint(ranges1, ranges2):
     :rtype: ``bool``
     """
 
-    # Arrange for ranges1 to be the longest list
-    if len(ranges1) < len(ranges2):
-        ranges1, ranges2 = ranges2, ranges1
-
-    # Look up each range from ranges2 and see if it's contained
-    for rng in ranges2:
-        start_idx, start_contained = _search_ranges(ranges1, rng.start)
-        end_idx, end_contained = _search_ranges(ranges1, rng.end, start_idx)
-
-        # If it's not wholely excluded, then the sets aren't disjoint
-        if start_idx != end_idx or start_contained or end_contained:
+    # Walk both lists in step, advancing past whichever range ends
+    # first; if the current ranges ever overlap, the sets aren't
+    # disjoint
+    len1 = len(ranges1)
+    len2 = len(ranges2)
+    idx1 = idx2 = 0
+    while idx1 < len1 and idx2 < len2:
+        start1, end1 = ranges1[idx1]
+        start2, end2 = ranges2[idx2]
+
+        if end1 < start2:
+            idx1 += 1
+        elif end2 < start1:
+            idx2 += 1
+        else:
             return False
 
     return True
 
 
-@six.python_2_unicode_compatible
-@six.add_metaclass(abc.ABCMeta)
-class BaseCharSet(collections.Set):
+class BaseCharSet(collections.abc.Set):
     """
     Represent a set of characters.  This differs from the standard
     Python ``set`` type by storing compact ranges of characters.  A
@@ -459,85 +733,88 @@ class BaseCharSet(collections.Set):
                   first element.
         """
 
-        # This is a dense little algorithm.  It works by creating a
-        # work queue using a priority queue data structure; the
-        # elements in the work queue are tuples of the ranges from the
-        # character sets and a list of the character sets the range is
-        # found in.  The priority queue is sorted such that range
-        # start points are sorted ascending, followed by sorting the
-        # ranges by length, which ensures that, for any entry in the
-        # queue, later entries with the same start point are either
-        # duplicates or supersets.
-        #
-        # After popping an item off, we pop off any duplicates
-        # (merging the lists of contributing character sets), then
-        # temporarily save all supersets.  If we find an entry that
-        # overlaps but is not a superset, then we split the working
-        # range in two and produce only the first half of the range.
-        # After that, the supersets are all split and added back to
-        # the queue, followed by the second half of the working range
-        # (if necessary).  Rinse, lather, repeat, until all the ranges
-        # have been processed.
-        #
-        # The end result is a sequence of CharSet instances containing
-        # simple ranges and a list of the input CharSet instances that
-        # are supersets of the result CharSet (so callers can identify
-        # containers-of-Charset that need to be split).
-
-        # Begin by setting up the priority work queue and extracting
-        # the range lists from all the input character sets
-        ranges = prioq.PrioQ(key=lambda x:
-                             (x[0].start, (x[0].end - x[0].start + 1)))
-        for cset in csets:
-            ranges.push(*((rng, [cset]) for rng in cset.ranges))
-
-        # Begin the workq
-        while ranges:
-            # Pop off a range to work with
-            rng, csets = ranges.pop()
-
-            # Collapse duplicate ranges
-            while ranges and ranges.top[0] == rng:
-                csets.extend(ranges.top[1])
-                ranges.pop()
-
-            # Select the start and end of the range we will produce
-            start = rng.start
-            end = rng.end
-
-            # Find all supersets (sorting criteria above ensures that
-            # all ranges after this one that share the same starting
-            # point are either identical or supersets)
-            fcsets = csets[:]
-            supersets = []
-            while ranges:
-                if ranges.top[0].start <= start:
-                    # Found a superset
-                    fcsets.extend(ranges.top[1])
-                    supersets.append(ranges.pop())
-                else:
-                    # OK, not a superset; does it overlap?
-                    if ranges.top[0].start <= end:
-                        # Yep, clamp the end of the produced range
-                        end = ranges.top[0].start - 1
+        get_cset = csets.__getitem__
+        for dj_cset, indexes in cls.disjoint_indexes(*csets):
+            yield dj_cset, list(map(get_cset, indexes))
 
-                    # We're done finding supersets/overlaps
-                    break
+    @classmethod
+    def disjoint_indexes(cls, *csets):
+        """
+        Compute the disjoint of two or more character sets, as
+        ``disjoint()`` does, but identify the input character sets by
+        their positions in the argument list.  This allows callers to
+        tell apart input character sets that are equal, or even the
+        same object.
 
-            # Produce the disjoint character set
-            yield cls(start, end), fcsets
+        :param *csets: The input character sets, instances of
+                       ``CharSet``.
 
-            # Move up the start endpoint for splitting the supersets
-            start = end + 1
+        :returns: A generator that yield two-element tuples; the first
+                  element will be a ``CharSet`` instance, and the
+                  second element will be a list, in ascending order,
+                  of the indexes of the input ``CharSet`` instances
+                  that are supersets of the first element.
+        """
 
-            # Split the supersets
-            ranges.push(*((Range(start, suset[0].end), suset[1])
-                          for suset in supersets))
+        # This is a classic sweep-line algorithm.  Each range of each
+        # input character set contributes two events: one at its
+        # start point, where the character set becomes active, and
+        # one just past its end point, where it becomes inactive.
+        # After sorting the events by position, a single sweep over
+        # them produces a disjoint range for each stretch between
+        # consecutive event positions where at least one character
+        # set is active.  The ranges within a single character set
+        # never overlap or adjoin, so the set of active character
+        # sets changes at every event position.
+        #
+        # The end result is a sequence of CharSet instances containing
+        # simple ranges and a list of the indexes of the input CharSet
+        # instances that are supersets of the result CharSet (so
+        # callers can identify containers-of-Charset that need to be
+        # split).  The lists of indexes are in ascending order.
+
+        # Build the list of events; at the same position, removals
+        # (False) sort ahead of additions (True).  The events are
+        # plain tuples, so they compare without a key function, and
+        # the events for each character set form an ascending run,
+        # which the sort merges rather than sorting from scratch
+        events = []
+        append = events.append
+        for idx, cset in enumerate(csets):
+            for start, end in cset.ranges:
+                append((start, True, idx))
+                append((end + 1, False, idx))
+        events.sort()
+
+        # Sweep over the events; bind the methods used for every
+        # event to locals
+        active = set()
+        activate = active.add
+        deactivate = active.discard
+        count = len(events)
+        i = 0
+        start = None
+        while i < count:
+            pos = events[i][0]
+
+            # Produce the range that ends just before this position.
+            # The sweep works on bare integers throughout, and the
+            # result is built directly from a range list, since the
+            # bounds are already known to be valid
+            if active:
+                yield (cls(None, [_make_range((start, pos - 1))]),
+                       sorted(active))
+
+            # Apply all the events at this position
+            while i < count and events[i][0] == pos:
+                _pos, adding, idx = events[i]
+                if adding:
+                    activate(idx)
+                else:
+                    deactivate(idx)
+                i += 1
 
-            # If the working range wasn't fully consumed, split it and
-            # add the unconsumed portion to the workq
-            if start < rng.end:
-                ranges.push((Range(start, rng.end), csets))
+            start = pos
 
     @abc.abstractmethod
     def __init__(self, ranges):
@@ -549,9 +826,22 @@ class BaseCharSet(collections.Set):
 
         self.ranges = ranges
 
-        # Cache the length of the set; this must be invalidated after
-        # any changes to the set
+        # Cache the length of the set, a lookup table of the Latin-1
+        # characters in the set, and the string representation of the
+        # set; these must be invalidated after any changes to the set
         self._len_cache = None
+        self._latin1_cache = None
+        self._str_cache = None
+
+    def _invalidate(self):
+        """
+        Invalidate the cached properties of the set.  This must be
+        called after any changes to the set.
+        """
+
+        self._len_cache = None
+        self._latin1_cache = None
+        self._str_cache = None
 
     def __str__(self):
         """
@@ -561,26 +851,36 @@ class BaseCharSet(collections.Set):
         :rtype: ``str``
         """
 
+        # Only recompute if necessary
+        if self._str_cache is not None:
+            return self._str_cache
+
         # Grab the length of the set first
         length = len(self)
 
         # Handle the simple cases first
         if length == 0:
-            return u'[]'
+            text = u'[]'
         elif length == FULL_LENGTH:
-            return u'[^]'
+            text = u'[^]'
         elif length == FULL_LENGTH - 1 and u'\n' not in self:
-            return u'.'
+            text = u'.'
 
-        # Should we use exclusion syntax or inclusion syntax?
-        if length > FULL_LENGTH // 2:
-            pfx = u'^'
-            ranges = _invert(self.ranges)
         else:
-            pfx = u''
-            ranges = self.ranges
+            # Should we use exclusion syntax or inclusion syntax?
+            if length > FULL_LENGTH // 2:
+                pfx = u'^'
+                ranges = _invert(self.ranges)
+            else:
+                pfx = u''
+                ranges = self.ranges
+
+            text = u'[%s%s]' % (pfx, u''.join(_rngstr(rng)
+                                              for rng in ranges))
 
-        return u'[%s%s]' % (pfx, u''.join(_rngstr(rng) for rng in ranges))
+        self._str_cache = text
+
+        return text
 
     def __contains__(self, item):
         """
@@ -595,23 +895,59 @@ class BaseCharSet(collections.Set):
         """
 
         # Convert string to integer
-        if isinstance(item, six.string_types):
+        if isinstance(item, str):
             item = ord(item)
 
-        return _search_ranges(self.ranges, item)[1]
+        # Sets containing a single range, such as [a-z] or [0-9], are
+        # very common; they need only a simple comparison
+        ranges = self.ranges
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            return start <= item <= end
+
+        # ASCII and Latin-1 characters are the most commonly tested,
+        # so answer those from a 256-entry lookup table, computed on
+        # first use
+        if 0 <= item < 0x100:
+            if self._latin1_cache is None:
+                table = bytearray(0x100)
+                for start, end in ranges:
+                    if start >= 0x100:
+                        break
+                    end = min(end, 0xff)
+                    table[start:end + 1] = b'\x01' * (end - start + 1)
+                self._latin1_cache = bytes(table)
+
+            return self._latin1_cache[item] == 1
+
+        return _search_ranges(ranges, item)[1]
 
     def __iter__(self):
         """
         Iterate over all characters contained in the set.
 
-        :returns: A generator that produces each character contained
+        :returns: An iterator that produces each character contained
                   in the set in sequence.  Characters are returned as
                   single-character strings.
         """
 
-        for rng in self.ranges:
-            for i in range(rng.start, rng.end + 1):
-                yield six.unichr(i)
+        # Let map() do the conversion and chain() string the ranges
+        # together, so that producing each character never has to
+        # resume a Python generator
+        return itertools.chain.from_iterable(
+            map(chr, range(start, end + 1)) for start, end in self.ranges)
+
+    def as_text(self):
+        """
+        Construct a string containing all the characters in the set, in
+        order.
+
+        :returns: A string of all the characters in the set.
+        :rtype: ``str``
+        """
+
+        return u''.join(u''.join(map(chr, range(start, end + 1)))
+                        for start, end in self.ranges)
 
     def __len__(self):
         """
@@ -623,17 +959,20 @@ class BaseCharSet(collections.Set):
         :rtype: ``int``
         """
 
-        # Only recompute if necessary
+        # Only recompute if necessary.  Each range contributes
+        # (end - start) + 1 characters; summing start - end with
+        # starmap() keeps the per-range work out of the interpreter
         if self._len_cache is None:
-            self._len_cache = sum((rng.end - rng.start) + 1
-                                  for rng in self.ranges)
+            ranges = self.ranges
+            self._len_cache = len(ranges) - sum(
+                itertools.starmap(operator.sub, ranges))
 
         return self._len_cache
 
     def __eq__(self, other):
         """
         Compare two character sets for equality.  This defers to
-        ``collections.Set`` if ``other`` is not a ``BaseCharSet``.
+        ``collections.abc.Set`` if ``other`` is not a ``BaseCharSet``.
 
         :param other: Another object to compare to.
 
@@ -642,14 +981,17 @@ class BaseCharSet(collections.Set):
         """
 
         if isinstance(other, BaseCharSet):
+            # Compare the ranges pairwise with map(), which works
+            # whether the ranges are held in lists or tuples and keeps
+            # the loop out of the interpreter
             return (len(self.ranges) == len(other.ranges) and
-                    all(a == b for a, b in zip(self.ranges, other.ranges)))
+                    all(map(operator.eq, self.ranges, other.ranges)))
         return super(BaseCharSet, self).__eq__(other)
 
     def __ne__(self, other):
         """
         Compare two character sets for inequality.  This defers to
-        ``collections.Set`` if ``other`` is not a ``BaseCharSet``.
+        ``collections.abc.Set`` if ``other`` is not a ``BaseCharSet``.
 
         :param other: Another object to compare to.
 
@@ -659,7 +1001,7 @@ class BaseCharSet(collections.Set):
 
         if isinstance(other, BaseCharSet):
             return (len(self.ranges) != len(other.ranges) or
-                    any(a != b for a, b in zip(self.ranges, other.ranges)))
+                    any(map(operator.ne, self.ranges, other.ranges)))
         return super(BaseCharSet, self).__ne__(other)
 
     def __le__(self, other):
@@ -709,7 +1051,7 @@ class BaseCharSet(collections.Set):
 
         # Copied from Python 2.7 library, because it doesn't work
         # properly in Python 3.4
-        if not isinstance(other, collections.Set):
+        if not isinstance(other, collections.abc.Set):
             return NotImplemented
         if len(self) < len(other):
             return False
@@ -735,7 +1077,7 @@ class BaseCharSet(collections.Set):
 
         # Copied from Python 2.7 library, because it doesn't work
         # properly in Python 3.4
-        if not isinstance(other, collections.Set):
+        if not isinstance(other, collections.abc.Set):
             return NotImplemented
         return len(self) > len(other) and self.__ge__(other)
 
@@ -837,12 +1179,19 @@ class BaseCharSet(collections.Set):
         :rtype: ``bool``
         """
 
-        # Search our ranges
+        # Walk both range lists in step.  Ranges are never adjacent,
+        # so each of our ranges must fit entirely within a single
+        # range of the other set
+        others = other.ranges
+        count = len(others)
         idx = 0
-        for rng in self.ranges:
-            # Search for the starting point in the other set
-            idx, contained = _search_ranges(other.ranges, rng.start, lo=idx)
-            if not contained or rng.end > other.ranges[idx].end:
+        for start, end in self.ranges:
+            # Skip the other set's ranges that end before this one
+            while idx < count and others[idx][1] < start:
+                idx += 1
+
+            if (idx >= count or others[idx][0] > start or
+                    others[idx][1] < end):
                 # Can't be a subset, then
                 return False
 
@@ -865,7 +1214,7 @@ class BaseCharSet(collections.Set):
         return super(BaseCharSet, self).isdisjoint(other)
 
 
-class CharSet(BaseCharSet, collections.MutableSet):
+class CharSet(BaseCharSet, collections.abc.MutableSet):
     """
     Represent a set of characters.  This differs from the standard
     Python ``set`` type by storing compact ranges of characters.  A
@@ -896,7 +1245,7 @@ class CharSet(BaseCharSet, collections.MutableSet):
             # Special escape: initialize from a list of ranges
             super(CharSet, self).__init__(list(end))
         elif start is not None:
-            if isinstance(start, six.integer_types):
+            if isinstance(start, int):
                 # Start and end must both be integers
                 _vchars(start)
                 if end is not None:
@@ -908,7 +1257,7 @@ class CharSet(BaseCharSet, collections.MutableSet):
                     Range(start, start if end is None else end),
                 ])
 
-            elif isinstance(start, six.string_types):
+            elif isinstance(start, str):
                 # Start and end must both be strings (single
                 # characters)
                 if end is not None and start > end:
@@ -922,14 +1271,16 @@ class CharSet(BaseCharSet, collections.MutableSet):
                 super(CharSet, self).__init__([Range(*start)])
 
             elif isinstance(start, BaseCharSet):
-                # Copy another character set
+                # Copy another character set, along with whatever
+                # has already been computed about it
                 super(CharSet, self).__init__(list(start.ranges))
+                self._len_cache = start._len_cache
+                self._latin1_cache = start._latin1_cache
+                self._str_cache = start._str_cache
 
             else:
                 # A sequence of items; add them all
-                super(CharSet, self).__init__([])
-                for item in start:
-                    self.add(item)
+                super(CharSet, self).__init__(_from_chars(start))
         else:
             # Make an empty set
             super(CharSet, self).__init__([])
@@ -949,7 +1300,7 @@ class CharSet(BaseCharSet, collections.MutableSet):
             # Short cut the identical sets case
             if self != other:
                 self.ranges = _intersection(self.ranges, other.ranges)
-                self._len_cache = None
+                self._invalidate()
             return self
         return super(CharSet, self).__iand__(other)
 
@@ -968,9 +1319,16 @@ class CharSet(BaseCharSet, collections.MutableSet):
             # Short cut the identical sets case
             if self != other:
                 self.ranges = _union(self.ranges, other.ranges)
-                self._len_cache = None
+                self._invalidate()
             return self
-        return super(CharSet, self).__ior__(other)
+
+        # Coalesce the characters into a range list and merge it in a
+        # single pass, rather than searching for each one in turn
+        ranges = _from_chars(other)
+        if ranges:
+            self.ranges = _union(self.ranges, ranges)
+            self._invalidate()
+        return self
 
     def __isub__(self, other):
         """
@@ -987,9 +1345,16 @@ class CharSet(BaseCharSet, collections.MutableSet):
             # Short cut the identical sets case
             self.ranges = ([] if self == other
                            else _difference(self.ranges, other.ranges))
-            self._len_cache = None
+            self._invalidate()
             return self
-        return super(CharSet, self).__isub__(other)
+
+        # Coalesce the characters into a range list and subtract it in
+        # a single pass, rather than searching for each one in turn
+        ranges = _from_chars(other)
+        if ranges and self.ranges:
+            self.ranges = _difference(self.ranges, ranges)
+            self._invalidate()
+        return self
 
     def __ixor__(self, other):
         """
@@ -1007,7 +1372,7 @@ class CharSet(BaseCharSet, collections.MutableSet):
             # Short cut the identical sets case
             self.ranges = ([] if self == other
                            else _sym_difference(self.ranges, other.ranges))
-            self._len_cache = None
+            self._invalidate()
             return self
         return super(CharSet, self).__ixor__(other)
 
@@ -1020,7 +1385,7 @@ class CharSet(BaseCharSet, collections.MutableSet):
         """
 
         # Convert string to integer
-        if isinstance(item, six.string_types):
+        if isinstance(item, str):
             item = ord(item)
         else:
             _vchars(item)
@@ -1031,13 +1396,52 @@ class CharSet(BaseCharSet, collections.MutableSet):
             # Item is already a member of the set
             return
 
-        # The length of the set will be altered; invalidate the length
-        # cache
-        self._len_cache = None
+        # The set will be altered; invalidate the cached properties
+        self._invalidate()
 
         # Add the range
         _add_range(self.ranges, item, item, (idx, contained), (idx, contained))
 
+    def add_range(self, start, end):
+        """
+        Add a range of characters to the character set.  This is
+        considerably cheaper than adding each character in the range
+        individually.
+
+        :param start: The first character of the range to add.  May
+                      be either a 1-character string or an integer.
+        :param end: The last character of the range to add.  May be
+                    either a 1-character string or an integer.
+
+        :raises ValueError:
+            One of the characters was outside the valid range, or
+            ``end`` precedes ``start``.
+        """
+
+        # Convert strings to integers
+        if isinstance(start, str):
+            start = ord(start)
+        else:
+            _vchars(start)
+        if isinstance(end, str):
+            end = ord(end)
+        else:
+            _vchars(end)
+        if start > end:
+            raise ValueError('invalid range "%c-%c"' % (start, end))
+
+        # Look up the insertion point
+        idx, contained = _search_ranges(self.ranges, start)
+        if contained and end <= self.ranges[idx][1]:
+            # Range is already a subset of the set
+            return
+
+        # The set will be altered; invalidate the cached properties
+        self._invalidate()
+
+        # Add the range
+        _add_range(self.ranges, start, end, (idx, contained))
+
     def discard(self, item):
         """
         Discard an item from the character set.
@@ -1047,7 +1451,7 @@ class CharSet(BaseCharSet, collections.MutableSet):
         """
 
         # Convert string to integer
-        if isinstance(item, six.string_types):
+        if isinstance(item, str):
             item = ord(item)
         else:
             _vchars(item)
@@ -1062,9 +1466,8 @@ class CharSet(BaseCharSet, collections.MutableSet):
             # Item is already excluded, so nothing to do
             return
 
-        # The length of the set will be altered; invalidate the length
-        # cache
-        self._len_cache = None
+        # The set will be altered; invalidate the cached properties
+        self._invalidate()
 
         # Remove the item
         _discard_range(self.ranges, item, item,
@@ -1082,7 +1485,7 @@ class CharSet(BaseCharSet, collections.MutableSet):
         """
 
         # Convert string to integer
-        if isinstance(item, six.string_types):
+        if isinstance(item, str):
             char = ord(item)
         else:
             _vchars(item)
@@ -1099,9 +1502,8 @@ class CharSet(BaseCharSet, collections.MutableSet):
             # using what was originally passed in for item
             raise KeyError(item)
 
-        # The length of the set will be altered; invalidate the length
-        # cache
-        self._len_cache = None
+        # The set will be altered; invalidate the cached properties
+        self._invalidate()
 
         # Remove the item
         _discard_range(self.ranges, item, item,
@@ -1120,11 +1522,11 @@ class CharSet(BaseCharSet, collections.MutableSet):
             raise KeyError()
 
         # Grab the first item and remove it
-        item = self.ranges[0].start
-        self._len_cache = None  # invalidate length cache
+        item = self.ranges[0][0]
+        self._invalidate()
         _discard_range(self.ranges, item, item, (0, True), (0, True))
 
-        return six.unichr(item)
+        return chr(item)
 
     def clear(self):
         """
@@ -1133,7 +1535,7 @@ class CharSet(BaseCharSet, collections.MutableSet):
 
         # This is easy
         self.ranges = []
-        self._len_cache = None  # invalidate length cache
+        self._invalidate()
 
 
 class FrozenCharSet(BaseCharSet):
@@ -1167,7 +1569,7 @@ class FrozenCharSet(BaseCharSet):
             # Special escape: initialize from a list of ranges
             super(FrozenCharSet, self).__init__(tuple(end))
         elif start is not None:
-            if isinstance(start, six.integer_types):
+            if isinstance(start, int):
                 # Start and end must both be integers
                 _vchars(start)
                 if end is not None:
@@ -1179,7 +1581,7 @@ class FrozenCharSet(BaseCharSet):
                     Range(start, start if end is None else end),
                 ))
 
-            elif isinstance(start, six.string_types):
+            elif isinstance(start, str):
                 # Start and end must both be strings (single
                 # characters)
                 if end is not None and start > end:
@@ -1193,18 +1595,51 @@ class FrozenCharSet(BaseCharSet):
                 super(FrozenCharSet, self).__init__((Range(*start),))
 
             elif isinstance(start, BaseCharSet):
-                # Copy another character set
+                # Copy another character set, along with whatever
+                # has already been computed about it
                 super(FrozenCharSet, self).__init__(tuple(start.ranges))
+                self._len_cache = start._len_cache
+                self._latin1_cache = start._latin1_cache
+                self._str_cache = start._str_cache
 
             else:
-                # A sequence of items; add them all, using a CharSet
-                # temporarily (since a FrozenCharSet is immutable)
-                tmp = CharSet(start, end)
-                super(FrozenCharSet, self).__init__(tuple(tmp.ranges))
+                # A sequence of items; coalesce them into ranges
+                super(FrozenCharSet, self).__init__(
+                    tuple(_from_chars(start)))
         else:
             # Make an empty set
             super(FrozenCharSet, self).__init__(())
 
+        # Cache the hash code; frozen sets are frequently used as
+        # dictionary keys
+        self._hash_cache = None
+
+    @classmethod
+    def intern(cls, start=None, end=None):
+        """
+        Construct a ``FrozenCharSet``, returning an existing instance
+        with the same contents if there is one.  Automata tend to use
+        the same few character sets over and over, and sharing them
+        saves memory and lets dictionary lookups succeed on identity.
+        Takes the same arguments as the constructor.
+
+        :returns: A ``FrozenCharSet`` instance.
+        :rtype: ``FrozenCharSet``
+        """
+
+        # When interning another character set, look it up by its
+        # ranges before going to the trouble of copying it
+        if end is None and isinstance(start, BaseCharSet):
+            key = (cls, tuple(start.ranges))
+            cached = _frozen_cache.get(key)
+            if cached is not None:
+                return cached
+            elif type(start) is cls:
+                return _frozen_cache.setdefault(key, start)
+
+        cset = cls(start, end)
+        return _frozen_cache.setdefault((cls, cset.ranges), cset)
+
     def __hash__(self):
         """
         Make a ``FrozenCharSet`` hashable.
@@ -1213,4 +1648,8 @@ class FrozenCharSet(BaseCharSet):
         :rtype: ``int``
         """
 
-        return hash(self.ranges)
+        # Only recompute if necessary
+        if self._hash_cache is None:
+            self._hash_cache = hash(self.ranges)
+
+        return self._hash_cache
@@ -15,128 +15,21 @@
 # <http://www.gnu.org/licenses/>.
 
 import heapq
-
-
-class KeyWrap(object):
-    """
-    Wraps an object with a key routine.  Comparisons are performed by
-    using the result of calling the key routine on the object.  This
-    allows complex key routines to be used with the standard Python
-    ``heapq`` operations.
-    """
-
-    __slots__ = ['obj', 'key']
-
-    def __init__(self, obj, key):
-        """
-        Initialize a ``KeyWrap`` instance.
-
-        :param obj: The object to be wrapped.
-        :param key: The key routine for the object.
-        """
-
-        self.obj = obj
-        self.key = key
-
-    def __eq__(self, other):
-        """
-        Compare for equality.
-
-        :param other: Another object to compare to.  If it's another
-                      ``KeyWrap`` object, compares the keys.
-
-        :returns: The result of the comparison.
-        :rtype: ``bool``
-        """
-
-        if isinstance(other, KeyWrap):
-            return self.key(self.obj) == other.key(other.obj)
-        return self.key(self.obj) == other
-
-    def __ne__(self, other):
-        """
-        Compare for inequality.
-
-        :param other: Another object to compare to.  If it's another
-                      ``KeyWrap`` object, compares the keys.
-
-        :returns: The result of the comparison.
-        :rtype: ``bool``
-        """
-
-        if isinstance(other, KeyWrap):
-            return self.key(self.obj) != other.key(other.obj)
-        return self.key(self.obj) != other
-
-    def __lt__(self, other):
-        """
-        Compare for less than.
-
-        :param other: Another object to compare to.  If it's another
-                      ``KeyWrap`` object, compares the keys.
-
-        :returns: The result of the comparison.
-        :rtype: ``bool``
-        """
-
-        if isinstance(other, KeyWrap):
-            return self.key(self.obj) < other.key(other.obj)
-        return self.key(self.obj) < other
-
-    def __le__(self, other):
-        """
-        Compare for less than or equal to.
-
-        :param other: Another object to compare to.  If it's another
-                      ``KeyWrap`` object, compares the keys.
-
-        :returns: The result of the comparison.
-        :rtype: ``bool``
-        """
-
-        if isinstance(other, KeyWrap):
-            return self.key(self.obj) <= other.key(other.obj)
-        return self.key(self.obj) <= other
-
-    def __gt__(self, other):
-        """
-        Compare for greater than.
-
-        :param other: Another object to compare to.  If it's another
-                      ``KeyWrap`` object, compares the keys.
-
-        :returns: The result of the comparison.
-        :rtype: ``bool``
-        """
-
-        if isinstance(other, KeyWrap):
-            return self.key(self.obj) > other.key(other.obj)
-        return self.key(self.obj) > other
-
-    def __ge__(self, other):
-        """
-        Compare for greater than or equal to.
-
-        :param other: Another object to compare to.  If it's another
-                      ``KeyWrap`` object, compares the keys.
-
-        :returns: The result of the comparison.
-        :rtype: ``bool``
-        """
-
-        if isinstance(other, KeyWrap):
-            return self.key(self.obj) >= other.key(other.obj)
-        return self.key(self.obj) >= other
+import itertools
 
 
 class PrioQ(object):
     """
     Implements a priority queue as a thin wrapper around the standard
-    Python ``heapq`` operations.  Uses ``KeyWrap`` to allow the use of
-    complex key routines with objects.
+    Python ``heapq`` operations.  Each item is stored on the heap as a
+    ``(key, count, item)`` tuple, so the key routine is called only
+    once per item and heap comparisons are native tuple comparisons.
+    The count breaks ties between items with equal keys, so the items
+    themselves are never compared, and such items are popped in the
+    order they were pushed.
     """
 
-    __slots__ = ['items', 'key']
+    __slots__ = ['items', 'key', '_counter']
 
     def __init__(self, items=None, key=lambda x: x):
         """
@@ -150,7 +43,9 @@ class PrioQ(object):
                     ``sorted()`` built-in.
         """
 
-        self.items = [KeyWrap(i, key) for i in (items or [])]
+        self._counter = itertools.count()
+        self.items = [(key(i), next(self._counter), i)
+                      for i in (items or [])]
         self.key = key
         heapq.heapify(self.items)
 
@@ -174,7 +69,8 @@ class PrioQ(object):
         """
 
         for item in items:
-            heapq.heappush(self.items, KeyWrap(item, self.key))
+            heapq.heappush(self.items,
+                           (self.key(item), next(self._counter), item))
 
     def pop(self):
         """
@@ -185,7 +81,7 @@ class PrioQ(object):
         :returns: The top item from the priority queue.
         """
 
-        return heapq.heappop(self.items).obj
+        return heapq.heappop(self.items)[2]
 
     @property
     def top(self):
@@ -195,4 +91,4 @@ class PrioQ(object):
         first, in order to maintain the heap property.
         """
 
-        return self.items[0].obj
+        return self.items[0][2]
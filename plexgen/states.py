@@ -14,35 +14,13 @@
 # along with this program.  If not, see
 # <http://www.gnu.org/licenses/>.
 
+import collections
+import itertools
 
-def _all_eps(trans_tab):
-    """
-    Determine if all transitions in the transitions table are
-    ``plexgen.transitions.Epsilon`` transitions.
-    ``plexgen.transitions.Epsilon`` transitions, by definition, have
-    priority 0.
+from plexgen import transitions
 
-    :param dict trans_tab: A transitions table.  This is a ``dict`` of
-                           ``set``s, keyed by the transition priority.
-                           The sets contain the actual transitions.
 
-    :returns: A ``True`` value indicates that the transitions table
-              contains only ``plexgen.transitions.Epsilon``
-              transitions.
-    """
-
-    for prio, trans_set in trans_tab.items():
-        if prio == 0:
-            # Priority 0 transitions are Epsilons, by definition
-            continue
-
-        if trans_set:
-            return False
-
-    return True
-
-
-def _iter_trans(trans_tab, prio):
+def _iter_trans(trans_tab, prio, prios):
     """
     Iterate over transitions in the transitions table.
 
@@ -51,6 +29,8 @@ def _iter_trans(trans_tab, prio):
                            The sets contain the actual transitions.
     :param prio: The priority level to iterate over.  If ``None``, all
                  transitions will be iterated over.
+    :param tuple prios: The priority levels present in ``trans_tab``,
+                        in ascending order.
 
     :returns: An iterator over the desired transitions.  Iteration
               will be ordered by priority, from lowest to highest; the
@@ -58,52 +38,162 @@ def _iter_trans(trans_tab, prio):
               undefined.
     """
 
-    # Priorities to iterate over
-    prios = sorted(trans_tab.keys()) if prio is None else [prio]
-    for prio in prios:
-        for trans in trans_tab.get(prio, set()):
-            yield trans
+    # A single priority needs no generator, and a missing priority
+    # needs no empty set
+    if prio is not None:
+        return iter(trans_tab.get(prio, ()))
+
+    return itertools.chain.from_iterable(
+        trans_tab[prio] for prio in prios)
 
 
-def eps_closure(states):
+def eps_closure(states, known=None):
     """
     Given an iterable of states, constructs a ``frozenset`` of states
     reachable by ``Epsilon`` transitions.
 
     :param states: An iterable of states.
+    :param dict known: An optional mapping of states to their
+                       already computed epsilon closures.  When the
+                       traversal reaches one of these states, its
+                       closure is added to the results wholesale,
+                       rather than traversing its transitions again.
 
     :returns: The states reachable by ``Epsilon`` transitions.
     :rtype: ``frozenset``
     """
 
-    # Construct the work queue and visited set
-    workq = list(states)
-    visited = set()
-
-    # And the result set
-    states = set(states)
+    # Construct the work queue and the result set; the result set
+    # also serves as the visited set, since a state is queued only
+    # when it is first added to the results
+    workq = collections.deque(states)
+    states = set(workq)
+    known_get = known.get if known else None
 
     while workq:
         # Pick a state off the queue
-        state = workq.pop(0)
+        state = workq.popleft()
+
+        # Traverse its outgoing epsilon transitions; this reads the
+        # priority 0 bucket directly, rather than going through
+        # iter_out(), to avoid setting up a generator for every state
+        for trans in state._trans_out.get(0, ()):
+            next_state = trans.state_in
+            if next_state not in states:
+                closure = known_get(next_state) if known_get else None
+                if closure is not None:
+                    # Already know everything reachable from it
+                    states |= closure
+                else:
+                    # OK, found a new state; add it to the result set
+                    # and ensure we visit it too
+                    states.add(next_state)
+                    workq.append(next_state)
 
-        # Remember the visit
-        visited.add(state)
+    # Convert to a frozenset so it can be hashed
+    return frozenset(states)
 
-        # Traverse its outgoing epsilon transitions
-        for trans in state.iter_out(0):
-            if trans.state_in in visited:
-                # Already visited that state; note that the Python
-                # optimizer may optimize away the continue
-                continue  # pragma: no cover
 
-            # OK, found a new state; add it to the result set and
-            # ensure we visit it too
-            states.add(trans.state_in)
-            workq.append(trans.state_in)
+def eps_closures(states, known=None):
+    """
+    Given an iterable of states, computes the epsilon closures of
+    those states and of every state reachable from them by
+    ``Epsilon`` transitions.  This finds the strongly connected
+    components of the epsilon transition graph, using Tarjan's
+    algorithm; all the states of a component share the same closure,
+    which is computed once, from the closures of the components it
+    leads to.
 
-    # Convert to a frozenset so it can be hashed
-    return frozenset(states)
+    :param states: An iterable of states.
+    :param dict known: An optional mapping of states to their
+                       already computed epsilon closures.  States
+                       found in this mapping are not traversed again,
+                       and are not included in the result.
+
+    :returns: A dictionary mapping states to their epsilon closures.
+              States in the same strongly connected component map to
+              the same ``frozenset``.
+    :rtype: ``dict``
+    """
+
+    closures = {}
+    known_get = known.get if known else None
+
+    # Tarjan's bookkeeping: the order in which each state was
+    # discovered, the lowest discovery order reachable from it, and
+    # the stack of states whose components are still open
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+
+    for root in states:
+        if root in index or (known_get and known_get(root) is not None):
+            continue
+
+        # Depth-first search without recursion; each work item is a
+        # state and an iterator over its remaining epsilon
+        # transitions
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(root._trans_out.get(0, ())))]
+
+        while work:
+            state, trans_iter = work[-1]
+
+            for trans in trans_iter:
+                next_state = trans.state_in
+                if next_state in index:
+                    # Already seen; if its component is still open,
+                    # it's part of a cycle with this state
+                    if next_state in on_stack and \
+                            index[next_state] < lowlink[state]:
+                        lowlink[state] = index[next_state]
+                elif not (known_get and
+                          known_get(next_state) is not None):
+                    # Descend into the new state
+                    index[next_state] = lowlink[next_state] = len(index)
+                    stack.append(next_state)
+                    on_stack.add(next_state)
+                    work.append(
+                        (next_state, iter(next_state._trans_out.get(0, ()))))
+                    break
+            else:
+                # Done with this state; propagate its lowlink to its
+                # parent
+                work.pop()
+                if work and lowlink[state] < lowlink[work[-1][0]]:
+                    lowlink[work[-1][0]] = lowlink[state]
+
+                # If it's the root of a component, close the component
+                if lowlink[state] == index[state]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member is state:
+                            break
+
+                    # The closure is the component itself, plus the
+                    # closures of every component it leads to; those
+                    # have all been closed already
+                    closure = set(members)
+                    for member in members:
+                        for trans in member._trans_out.get(0, ()):
+                            next_state = trans.state_in
+                            if next_state not in closure:
+                                closure |= (
+                                    closures.get(next_state) or
+                                    known_get(next_state)
+                                )
+                    closure = frozenset(closure)
+
+                    for member in members:
+                        closures[member] = closure
+
+    return closures
 
 
 class State(object):
@@ -112,6 +202,13 @@ class State(object):
     and out of the state.
     """
 
+    # Large automata contain a great many states, so avoid the
+    # per-instance __dict__
+    __slots__ = ('accepting', 'code', 'name', '_trans_in', '_trans_out',
+                 '_in_prios', '_out_prios', '_in_by_cls', '_out_by_cls',
+                 '_in_by_source', '_out_by_target', '_noneps_in',
+                 '_noneps_out')
+
     def __init__(self, accepting=False, code=None):
         """
         Initialize a ``State`` instance.
@@ -136,9 +233,34 @@ class State(object):
         self._trans_in = {}
         self._trans_out = {}
 
-        # Cache for the results of eps_in and eps_out
-        self._eps_in = None
-        self._eps_out = None
+        # The priority levels present in the transition tables, in
+        # ascending order; kept up to date as levels are added, so
+        # that iterating over all transitions need not sort them
+        self._in_prios = ()
+        self._out_prios = ()
+
+        # The same transitions, indexed by transition class.  Keys are
+        # transition classes, and values are sets of transitions.
+        # Unlike the transition tables, no bookkeeping is needed when
+        # a new key is added, so let the dictionaries create the sets
+        self._in_by_cls = collections.defaultdict(set)
+        self._out_by_cls = collections.defaultdict(set)
+
+        # The same transitions again, indexed by the state at the
+        # other end and the transition class.  Keys are 2-tuples of
+        # the state and the transition class, and values are sets of
+        # transitions.  These make finding the transitions a new
+        # transition may merge with a simple lookup.
+        self._in_by_source = collections.defaultdict(set)
+        self._out_by_target = collections.defaultdict(set)
+
+        # Counts of the non-epsilon transitions into and out of the
+        # state, maintained as transitions are added; these make
+        # eps_in and eps_out simple checks.  Note that
+        # ``plexgen.transitions.Epsilon`` transitions, by definition,
+        # have priority 0.
+        self._noneps_in = 0
+        self._noneps_out = 0
 
     def reverse(self):
         """
@@ -150,6 +272,11 @@ class State(object):
         """
 
         self._trans_in, self._trans_out = self._trans_out, self._trans_in
+        self._in_prios, self._out_prios = self._out_prios, self._in_prios
+        self._in_by_cls, self._out_by_cls = self._out_by_cls, self._in_by_cls
+        self._in_by_source, self._out_by_target = (self._out_by_target,
+                                                   self._in_by_source)
+        self._noneps_in, self._noneps_out = self._noneps_out, self._noneps_in
 
     def transition(self, trans_class, next_state, **kwargs):
         """
@@ -165,39 +292,185 @@ class State(object):
                          ``trans_class`` constructor.
         """
 
-        # Construct the new transition
-        trans = trans_class(self, next_state, **kwargs)
+        self._add_transition(trans_class(self, next_state, **kwargs))
 
-        # Add it to the states; begin by initializing the transition
-        # priority buckets in both states
-        self._trans_out.setdefault(trans.priority, set())
-        next_state._trans_in.setdefault(trans.priority, set())
+    def epsilon_to(self, next_state):
+        """
+        Add an epsilon transition to another state.  This is
+        equivalent to ``transition(plexgen.transitions.Epsilon,
+        next_state)``, but since all epsilon transitions between two
+        states are equivalent, there's nothing to merge; if one
+        already exists, this does nothing.
+
+        :param next_state: The state to transition to.
+        :type next_state: ``State``
+        """
+
+        if not self._out_by_target.get((next_state, transitions.Epsilon)):
+            self._link(transitions.Epsilon(self, next_state))
+
+    def transitions(self, trans_class, next_state, kwargs_list):
+        """
+        Add several transitions of the same class to another state.
+        This is equivalent to calling ``transition()`` once for each
+        element of ``kwargs_list``, but the buckets of both states
+        are only updated once, after all the transitions have been
+        merged.
+
+        :param trans_class: The class of the transitions.
+        :type trans_class: ``plexgen.transitions.Transition`` subclass
+        :param next_state: The state to transition to.
+        :type next_state: ``State``
+        :param kwargs_list: An iterable of dictionaries of keyword
+                            arguments to be passed to the
+                            ``trans_class`` constructor, one for each
+                            transition.
+        """
+
+        self._add_transitions(
+            next_state,
+            [trans_class(self, next_state, **kwargs)
+             for kwargs in kwargs_list],
+        )
+
+    def _add_transition(self, trans):
+        """
+        Add an already constructed transition to another state, merging
+        it with any existing transitions as ``transition()`` does.
+        This avoids expanding and validating the transition's keyword
+        arguments again when duplicating an existing transition,
+        such as when constructing a DFA.
+
+        :param trans: The transition to add.  Its ``state_out`` must
+                      be this state.
+        :type trans: ``plexgen.transitions.Transition``
+        """
+
+        self._add_transitions(trans.state_in, [trans])
+
+    def _add_transitions(self, next_state, trans_list):
+        """
+        Add already constructed transitions to another state, merging
+        them with any existing transitions.
+
+        :param next_state: The state the transitions go to.
+        :type next_state: ``State``
+        :param list trans_list: A list of the transitions to add.  All
+                                the transitions must be instances of
+                                the same class, their ``state_out``
+                                must be this state, and their
+                                ``state_in`` must be ``next_state``.
+        """
+
+        # Nothing to do if there are no transitions
+        if not trans_list:
+            return
+
+        # Add it to the states; begin by looking up (or initializing)
+        # the transition priority and class buckets in both states
+        prio = trans_list[0].priority
+        cls = trans_list[0].__class__
+        out_prio = self._out_bucket(prio)
+        in_prio = next_state._in_bucket(prio)
+        out_cls = self._out_by_cls[cls]
+        in_cls = next_state._in_by_cls[cls]
 
         # Find all similar transitions between us and next_state
-        others = set([
-            t for t in self._trans_out[trans.priority]
-            if t.state_in is next_state and t.__class__ is trans.__class__
-        ])
-
-        # Now, can the transition be merged?
-        update = trans.merge(others)
-        if update is None:
-            # Can't merge, just add the transition
-            self._trans_out[trans.priority].add(trans)
-            next_state._trans_in[trans.priority].add(trans)
-        else:
-            # We've merged; remove others from the existing
-            # transitions
-            self._trans_out[trans.priority] -= others
-            next_state._trans_in[trans.priority] -= others
-
-            # Now apply the merged update
-            self._trans_out[trans.priority] |= update
-            next_state._trans_in[trans.priority] |= update
-
-        # Adding transitions invalidates the _eps_{in,out} caches
-        next_state._eps_in = None
-        self._eps_out = None
+        out_key = (next_state, cls)
+        in_key = (self, cls)
+        existing = self._out_by_target.get(out_key, set())
+
+        # Now, merge each transition into the set of transitions
+        # between the two states.  Note that merge() may alter the
+        # set it's passed, so hand it a copy
+        merged = existing
+        for trans in trans_list:
+            update = trans.merge(set(merged))
+            if update is None:
+                # Can't merge, just add the transition
+                merged = merged | set([trans])
+            else:
+                merged = update
+
+        # If the transitions were absorbed by the existing ones,
+        # nothing changes
+        if merged == existing:
+            return
+
+        # Replace the existing transitions with the merged ones
+        for bucket in (out_prio, in_prio, out_cls, in_cls):
+            bucket.difference_update(existing)
+            bucket.update(merged)
+        self._out_by_target[out_key] = set(merged)
+        next_state._in_by_source[in_key] = set(merged)
+
+        # Update the non-epsilon transition counts
+        if prio != 0:
+            count = len(merged) - len(existing)
+            self._noneps_out += count
+            next_state._noneps_in += count
+
+    def _in_bucket(self, prio):
+        """
+        Retrieve the set of incoming transitions with a given priority,
+        creating it if necessary.
+
+        :param int prio: The transition priority.
+
+        :returns: The set of incoming transitions with that priority.
+        :rtype: ``set``
+        """
+
+        bucket = self._trans_in.get(prio)
+        if bucket is None:
+            bucket = self._trans_in[prio] = set()
+            self._in_prios = tuple(sorted(self._trans_in))
+        return bucket
+
+    def _out_bucket(self, prio):
+        """
+        Retrieve the set of outgoing transitions with a given priority,
+        creating it if necessary.
+
+        :param int prio: The transition priority.
+
+        :returns: The set of outgoing transitions with that priority.
+        :rtype: ``set``
+        """
+
+        bucket = self._trans_out.get(prio)
+        if bucket is None:
+            bucket = self._trans_out[prio] = set()
+            self._out_prios = tuple(sorted(self._trans_out))
+        return bucket
+
+    def _link(self, trans):
+        """
+        Add a transition to another state, without attempting to merge
+        it with any existing transitions.  This is used when the
+        transition is already known to be merged, such as when
+        duplicating a machine.
+
+        :param trans: The transition to add.  Its ``state_out`` must
+                      be this state.
+        :type trans: ``plexgen.transitions.Transition``
+        """
+
+        next_state = trans.state_in
+        cls = trans.__class__
+
+        # Add it to the transition tables of both states
+        self._out_bucket(trans.priority).add(trans)
+        next_state._in_bucket(trans.priority).add(trans)
+        self._out_by_cls[cls].add(trans)
+        next_state._in_by_cls[cls].add(trans)
+        self._out_by_target[next_state, cls].add(trans)
+        next_state._in_by_source[self, cls].add(trans)
+
+        # Update the non-epsilon transition counts
+        if trans.priority != 0:
+            self._noneps_out += 1
+            next_state._noneps_in += 1
 
     def iter_in(self, prio=None):
         """
@@ -213,7 +486,7 @@ class State(object):
                   undefined.
         """
 
-        return _iter_trans(self._trans_in, prio)
+        return _iter_trans(self._trans_in, prio, self._in_prios)
 
     def iter_out(self, prio=None):
         """
@@ -229,7 +502,19 @@ class State(object):
                   undefined.
         """
 
-        return _iter_trans(self._trans_out, prio)
+        return _iter_trans(self._trans_out, prio, self._out_prios)
+
+    def iter_out_by_cls(self):
+        """
+        Iterate over all transitions from this state, grouped by
+        transition class.
+
+        :returns: An iterator over 2-tuples; the first element is a
+                  transition class, and the second is a ``set`` of
+                  the transitions of that class.
+        """
+
+        return iter(self._out_by_cls.items())
 
     @property
     def eps_in(self):
@@ -238,10 +523,7 @@ class State(object):
         transitions are ``plexgen.transitions.Epsilon`` transitions.
         """
 
-        if self._eps_in is None:
-            self._eps_in = _all_eps(self._trans_in)
-
-        return self._eps_in
+        return not self._noneps_in
 
     @property
     def eps_out(self):
@@ -250,7 +532,4 @@ class State(object):
         transitions are ``plexgen.transitions.Epsilon`` transitions.
         """
 
-        if self._eps_out is None:
-            self._eps_out = _all_eps(self._trans_out)
-
-        return self._eps_out
+        return not self._noneps_out
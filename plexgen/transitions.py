@@ -15,19 +15,23 @@
 # <http://www.gnu.org/licenses/>.
 
 import abc
-
-import six
+import operator
 
 from plexgen import charset
 
 
-@six.add_metaclass(abc.ABCMeta)
-class Transition(object):
+class Transition(object, metaclass=abc.ABCMeta):
     """
     An abstract base class for all transitions.  A transition moves
     from one state of an automaton to another.
     """
 
+    # Large automata contain a great many transitions, so avoid the
+    # per-instance __dict__; subclasses should declare their own
+    # __slots__, naming each of their trans_args, since the
+    # transition arguments are stored as attributes
+    __slots__ = ('state_out', 'state_in')
+
     # Defaults for transition arguments.
     defaults = {}
 
@@ -77,43 +81,60 @@ class Transition(object):
 
         # Now go through all the arguments, applying transformations
         # as necessary
+        xforms = self.xforms
         for name, value in kwargs.items():
-            if name in self.xforms:
-                value = self.xforms[name](value)
+            if name in xforms:
+                value = xforms[name](value)
 
             args[name] = value
 
-        # Check if any required arguments are missing
-        missing = self.trans_args - set(args.keys())
-        if missing:
-            raise TypeError('missing required keyword arguments: "%s"' %
-                            '", "'.join(arg for arg in sorted(missing)))
-
-        # Check if there are any extra arguments
-        extra = set(args.keys()) - self.trans_args
-        if extra:
-            raise TypeError('unknown extra keyword arguments: "%s"' %
-                            '", "'.join(arg for arg in sorted(extra)))
-
-        # Save the arguments
+        # Dictionary key views compare directly against sets, so the
+        # usual case of exactly the right arguments needs no set
+        # arithmetic
+        if args.keys() != self.trans_args:
+            # Check if any required arguments are missing
+            missing = self.trans_args - args.keys()
+            if missing:
+                raise TypeError('missing required keyword arguments: "%s"' %
+                                '", "'.join(arg for arg in sorted(missing)))
+
+            # Check if there are any extra arguments
+            extra = args.keys() - self.trans_args
+            if extra:
+                raise TypeError('unknown extra keyword arguments: "%s"' %
+                                '", "'.join(arg for arg in sorted(extra)))
+
+        # Save the arguments.  They're stored as attributes, so that
+        # reading them, as match() does for every character, is a
+        # plain attribute access
         self.state_out = state_out
         self.state_in = state_in
-        self.args = args
+        for name, value in args.items():
+            setattr(self, name, value)
 
-    def __getattr__(self, attr):
+    def copy(self, state_out, state_in):
         """
-        Retrieve keyword arguments passed to the constructor.
+        Construct a duplicate of this transition between two other
+        states.  The transition argument values are shared with this
+        transition, rather than being transformed and validated
+        again; they are never altered after construction.
 
-        :param str attr: The name of the keyword argument to retrieve.
+        :param state_out: The origin state for the duplicate.
+        :type state_out: ``plexgen.states.State``
+        :param state_in: The destination state for the duplicate.
+        :type state_in: ``plexgen.states.State``
 
-        :returns: The value of the designated keyword argument.
+        :returns: The duplicate transition.
+        :rtype: ``Transition``
         """
 
-        try:
-            return self.args[attr]
-        except KeyError:
-            raise AttributeError("'%s' object has no attribute '%s'" %
-                                 (self.__class__.__name__, attr))
+        new = self.__class__.__new__(self.__class__)
+        new.state_out = state_out
+        new.state_in = state_in
+        for name in self.trans_args:
+            setattr(new, name, getattr(self, name))
+
+        return new
 
     def reverse(self):
         """
@@ -197,6 +218,8 @@ class Epsilon(Transition):
     constructing the lexer.  This transition takes no arguments.
     """
 
+    __slots__ = ()
+
     trans_args = set()
     priority = 0
 
@@ -270,10 +293,12 @@ class MatchChar(Transition):
     ``plexgen.charset.CharSet``.
     """
 
+    __slots__ = ('cset',)
+
     trans_args = set(['cset'])
     priority = 1
     xforms = {
-        'cset': charset.FrozenCharSet,
+        'cset': charset.FrozenCharSet.intern,
     }
 
     @classmethod
@@ -293,21 +318,44 @@ class MatchChar(Transition):
                   ``Transition`` instance.
         """
 
-        # Begin by producing a map from the character set to the
-        # original transition
-        cset_map = {t.cset: t for t in transitions}
-
-        # Calculate the disjoint of all the character sets and build
-        # the transition lists to produce
-        for dj_cset, in_csets in charset.CharSet.disjoint(
+        # A lone transition is already disjoint; there's no need to
+        # split its character set into ranges
+        if len(transitions) == 1:
+            yield transitions
+            return
+
+        # Calculate the disjoint of all the character sets, grouping
+        # the disjoint ranges by the input transitions whose character
+        # sets contain them; ranges in the same group lead to the same
+        # states, so they need only a single transition between them.
+        # Transitions are identified by position, since several of
+        # them may well share the same character set
+        groups = {}
+        for dj_cset, indexes in charset.CharSet.disjoint_indexes(
                 *(t.cset for t in transitions)):
+            key = tuple(indexes)
+            if key in groups:
+                groups[key].append(dj_cset)
+            else:
+                groups[key] = [dj_cset]
+
+        # Build the transition lists to produce.  The ranges in a
+        # group come out of the sweep in ascending order and are never
+        # adjacent, so they form a valid range list as they are
+        for indexes, dj_csets in groups.items():
+            if len(dj_csets) == 1:
+                dj_cset = dj_csets[0]
+            else:
+                dj_cset = charset.CharSet(
+                    None, [rng for cs in dj_csets for rng in cs.ranges])
+
             yield [
                 cls(
-                    cset_map[cs].state_out,
-                    cset_map[cs].state_in,
+                    transitions[idx].state_out,
+                    transitions[idx].state_in,
                     cset=dj_cset,
                 )
-                for cs in in_csets
+                for idx in indexes
             ]
 
     def match(self, char, sim):
@@ -367,7 +415,7 @@ class MatchChar(Transition):
 
         # Create and return a new MatchChar transition with the merged
         # character sets
-        return set([self.__class__(self.state_in, self.state_out, cset=cset)])
+        return set([self.__class__(self.state_out, self.state_in, cset=cset)])
 
 
 class Action(Transition):
@@ -392,6 +440,8 @@ class Action(Transition):
     might be useful in outputting the actual lexers.
     """
 
+    __slots__ = ('action', 'precedence', 'name')
+
     trans_args = set(['action', 'precedence', 'name'])
     priority = 2
     defaults = {
@@ -469,4 +519,4 @@ class Action(Transition):
         others.add(self)
 
         # Return the one with the smallest precedence
-        return set([sorted(others, key=lambda x: x.precedence)[0]])
+        return set([min(others, key=operator.attrgetter('precedence'))])
@@ -60,14 +60,13 @@ setuptools.setup(
         'License :: OSI Approved :: GNU General Public License v3 or '
         'later (GPLv3+)',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
     ],
     packages=setuptools.find_packages(exclude=['tests', 'tests.*']),
+    python_requires='>=3.4',
     install_requires=readreq('requirements.txt'),
     tests_require=readreq('test-requirements.txt'),
     entry_points={
@@ -3,32 +3,574 @@ import unittest
 import mock
 
 from plexgen import automaton
+from plexgen import charset
+from plexgen import transitions
 
 
-class TestStateMapper(unittest.TestCase):
+class TestClosureCache(unittest.TestCase):
     def test_init(self):
-        src = mock.Mock(_start='src_start')
-        dest = mock.Mock(_start='dest_start')
+        result = automaton._ClosureCache()
 
-        result = automaton._StateMapper(src, dest)
+        self.assertEqual(result, {})
+        self.assertEqual(result.interned, {})
 
-        self.assertEqual(result, {'src_start': 'dest_start'})
-        self.assertEqual(result.src, src)
-        self.assertEqual(result.dest, dest)
+    @mock.patch.object(automaton.states, 'eps_closures',
+                       side_effect=lambda x, known: {
+                           st: frozenset([st, 'st9']) for st in x
+                       })
+    def test_missing(self, mock_eps_closures):
+        key1 = frozenset(['st1', 'st2'])
+        key2 = frozenset(['st1', 'st2', 'st9'])
+        obj = automaton._ClosureCache()
 
-    def test_init(self):
-        src = mock.Mock(_start='src_start')
-        dest = mock.Mock(**{
-            '_start': 'dest_start',
-            '_new_state.return_value': 'new_state',
+        result1 = obj[key1]
+        result2 = obj[key2]
+        result3 = obj[key1]
+
+        self.assertEqual(result1, frozenset(['st1', 'st2', 'st9']))
+        self.assertIs(result2, result1)
+        self.assertIs(result3, result1)
+        self.assertEqual(obj, {
+            key1: result1,
+            key2: result1,
+            'st1': frozenset(['st1', 'st9']),
+            'st2': frozenset(['st2', 'st9']),
+            'st9': frozenset(['st9']),
+        })
+        self.assertEqual(obj.interned, {
+            result1: result1,
+            obj['st1']: obj['st1'],
+            obj['st2']: obj['st2'],
+            obj['st9']: obj['st9'],
         })
-        key = mock.Mock(accepting='accepting')
-        obj = automaton._StateMapper(src, dest)
+        mock_eps_closures.assert_has_calls([
+            mock.call(('st1',), obj),
+            mock.call(('st2',), obj),
+            mock.call(('st9',), obj),
+        ], any_order=True)
+        self.assertEqual(mock_eps_closures.call_count, 3)
 
-        result = obj[key]
+    @mock.patch.object(automaton.states, 'eps_closures', return_value={
+        'st1': frozenset(['st1', 'st2', 'st3']),
+        'st2': frozenset(['st2', 'st3']),
+        'st3': frozenset(['st2', 'st3']),
+    })
+    def test_missing_single(self, mock_eps_closures):
+        obj = automaton._ClosureCache()
 
-        self.assertEqual(result, 'new_state')
+        result = obj['st1']
+
+        self.assertEqual(result, frozenset(['st1', 'st2', 'st3']))
         self.assertEqual(obj, {
-            'src_start': 'dest_start',
-            key: 'new_state',
+            'st1': result,
+            'st2': frozenset(['st2', 'st3']),
+            'st3': frozenset(['st2', 'st3']),
+        })
+        self.assertIs(obj['st2'], obj['st3'])
+        self.assertEqual(obj.interned, {
+            result: result,
+            obj['st2']: obj['st2'],
         })
+        mock_eps_closures.assert_called_once_with(('st1',), obj)
+
+
+class TestMachine(unittest.TestCase):
+    def test_compile(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state()
+        st2 = obj._new_state(True)
+        obj._start.transition(transitions.MatchChar, st1,
+                              cset=charset.CharSet('a', 'c'))
+        obj._start.transition(transitions.MatchChar, st2,
+                              cset=charset.CharSet('x'))
+        st1.transition(transitions.MatchChar, st2,
+                       cset=charset.CharSet('0', '9'))
+        st1.transition(transitions.MatchChar, st1,
+                       cset=charset.CharSet('_'))
+
+        result = obj.compile()
+
+        for string, expected in [('', False), ('x', True), ('a', False),
+                                 ('b0', True), ('c__9', True),
+                                 ('a9x', False), ('d0', False),
+                                 ('xx', False), (u'\u1234', False)]:
+            self.assertEqual(result(string), expected)
+
+    def test_compile_accepting_start(self):
+        obj = automaton.Machine(True)
+
+        result = obj.compile()
+
+        self.assertTrue(result(''))
+        self.assertFalse(result('a'))
+
+    def test_compile_nfa(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state(True)
+        obj._start.transition(transitions.Epsilon, st1)
+
+        self.assertRaises(TypeError, obj.compile)
+
+    def test_compile_action(self):
+        obj = automaton.Machine()
+        obj._start.transition(transitions.Action, obj._start,
+                              action='act', precedence=1)
+
+        self.assertRaises(TypeError, obj.compile)
+
+    def test_minimize(self):
+        # Two equivalent paths: [ab] then c, and x then c
+        obj = automaton.Machine()
+        st1 = obj._new_state()
+        st2 = obj._new_state()
+        st3 = obj._new_state(True)
+        st4 = obj._new_state(True)
+        obj._start.transition(transitions.MatchChar, st1,
+                              cset=charset.CharSet('a', 'b'))
+        obj._start.transition(transitions.MatchChar, st2,
+                              cset=charset.CharSet('x'))
+        st1.transition(transitions.MatchChar, st3,
+                       cset=charset.CharSet('c'))
+        st2.transition(transitions.MatchChar, st4,
+                       cset=charset.CharSet('c'))
+
+        result = obj.minimize()
+
+        self.assertEqual(len(result), 3)
+        start_trans = list(result._start.iter_out())
+        self.assertEqual(len(start_trans), 1)
+        self.assertEqual(start_trans[0].cset,
+                         charset.CharSet('a', 'b') | charset.CharSet('x'))
+        mid_trans = list(start_trans[0].state_in.iter_out())
+        self.assertEqual(len(mid_trans), 1)
+        self.assertEqual(mid_trans[0].cset, charset.CharSet('c'))
+        self.assertTrue(mid_trans[0].state_in.accepting)
+        self.assertEqual(result._accepting, set([mid_trans[0].state_in]))
+        matcher = result.compile()
+        for string, expected in [('ac', True), ('bc', True), ('xc', True),
+                                 ('cc', False), ('a', False), ('', False)]:
+            self.assertEqual(matcher(string), expected)
+
+    def test_minimize_dead(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state()
+        st2 = obj._new_state(True)
+        obj._start.transition(transitions.MatchChar, st1,
+                              cset=charset.CharSet('a'))
+        obj._start.transition(transitions.MatchChar, st2,
+                              cset=charset.CharSet('b'))
+        st1.transition(transitions.MatchChar, st1,
+                       cset=charset.CharSet('a'))
+
+        result = obj.minimize()
+
+        self.assertEqual(len(result), 2)
+        trans = list(result._start.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertEqual(trans[0].cset, charset.CharSet('b'))
+        self.assertTrue(trans[0].state_in.accepting)
+
+    def test_minimize_accepting_start(self):
+        obj = automaton.Machine(True)
+        st1 = obj._new_state(True)
+        obj._start.transition(transitions.MatchChar, st1,
+                              cset=charset.CharSet('a'))
+        st1.transition(transitions.MatchChar, st1,
+                       cset=charset.CharSet('a'))
+
+        result = obj.minimize()
+
+        self.assertEqual(len(result), 1)
+        self.assertTrue(result._start.accepting)
+        self.assertEqual(result._accepting, set([result._start]))
+        trans = list(result._start.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertIs(trans[0].state_in, result._start)
+
+    def test_minimize_nfa(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state(True)
+        obj._start.transition(transitions.Epsilon, st1)
+
+        self.assertRaises(TypeError, obj.minimize)
+
+    def test_minimize_action(self):
+        obj = automaton.Machine()
+        obj._start.transition(transitions.Action, obj._start,
+                              action='act', precedence=1)
+
+        self.assertRaises(TypeError, obj.minimize)
+
+    def test_reverse(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state(True)
+        obj._start.transition(transitions.MatchChar, st1,
+                              cset=charset.CharSet('a'))
+        start = obj._start
+
+        result = obj.reverse()
+
+        self.assertIs(result, obj)
+        self.assertIs(obj._start, st1)
+        self.assertFalse(st1.accepting)
+        self.assertTrue(start.accepting)
+        self.assertEqual(obj._accepting, set([start]))
+        self.assertIs(obj._final, start)
+        trans = list(st1.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertIs(trans[0].state_out, st1)
+        self.assertIs(trans[0].state_in, start)
+
+    def test_reverse_mixed(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state()
+        st2 = obj._new_state(True)
+        obj._start.transition(transitions.MatchChar, st1,
+                              cset=charset.CharSet('a'))
+        st1.transition(transitions.Epsilon, st2)
+        start = obj._start
+
+        obj.reverse()
+
+        self.assertIs(obj._start, st2)
+        self.assertEqual(obj._accepting, set([start]))
+        for state in (start, st1, st2):
+            for trans in state.iter_out():
+                self.assertIs(trans.state_out, state)
+            for trans in state.iter_in():
+                self.assertIs(trans.state_in, state)
+        trans = list(st2.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertIsInstance(trans[0], transitions.Epsilon)
+        self.assertIs(trans[0].state_in, st1)
+        trans = list(st1.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertIsInstance(trans[0], transitions.MatchChar)
+        self.assertIs(trans[0].state_in, start)
+
+    def test_copy(self):
+        obj = automaton.Machine(True, 'code')
+        st1 = obj._new_state()
+        st2 = obj._new_state(True)
+        obj._start.transition(transitions.MatchChar, st1,
+                              cset=charset.CharSet('a'))
+        st1.transition(transitions.Epsilon, st2)
+        st2.transition(transitions.MatchChar, obj._start,
+                       cset=charset.CharSet('b'))
+
+        result = obj.copy()
+
+        self.assertEqual(len(result), 3)
+        self.assertTrue(result._start.accepting)
+        self.assertEqual(result._start.code, 'code')
+        self.assertEqual(len(result._accepting), 2)
+        self.assertTrue(set(result).isdisjoint(set(obj)))
+        trans = list(result._start.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertEqual(trans[0].cset, charset.CharSet('a'))
+        self.assertIs(trans[0].state_out, result._start)
+        new_st1 = trans[0].state_in
+        self.assertFalse(new_st1.accepting)
+        self.assertEqual(list(new_st1.iter_in()), trans)
+        trans = list(new_st1.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertIsInstance(trans[0], transitions.Epsilon)
+        new_st2 = trans[0].state_in
+        self.assertTrue(new_st2.accepting)
+        trans = list(new_st2.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertEqual(trans[0].cset, charset.CharSet('b'))
+        self.assertIs(trans[0].state_in, result._start)
+
+    def test_merge_states(self):
+        obj = automaton.Machine()
+        obj_st = obj._new_state()
+        other = automaton.Machine()
+        states = obj._states
+
+        obj._merge_states(other)
+
+        self.assertIs(obj._states, states)
+        self.assertEqual(obj._states, set([obj._start, obj_st,
+                                           other._start]))
+
+    def test_merge_states_larger(self):
+        obj = automaton.Machine()
+        other = automaton.Machine()
+        other_st = other._new_state()
+        states = other._states
+
+        obj._merge_states(other)
+
+        self.assertIs(obj._states, states)
+        self.assertEqual(obj._states, set([obj._start, other._start,
+                                           other_st]))
+
+    def test_iter(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state()
+        st2 = obj._new_state(True)
+        st3 = obj._new_state()
+        st4 = obj._new_state(True)
+
+        result = list(obj)
+
+        self.assertEqual(len(result), 5)
+        self.assertIs(result[0], obj._start)
+        self.assertEqual(set(result[1:3]), set([st1, st3]))
+        self.assertEqual(set(result[3:]), set([st2, st4]))
+
+    def test_iter_accepting_start(self):
+        obj = automaton.Machine(True)
+        st1 = obj._new_state()
+        st2 = obj._new_state(True)
+
+        result = list(obj)
+
+        self.assertEqual(result, [obj._start, st1, st2])
+
+    def test_final_none(self):
+        obj = automaton.Machine()
+
+        self.assertIsNone(obj._final)
+        self.assertIsNone(obj._final_cache)
+
+    def test_final_single(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state(True)
+
+        result = obj._final
+
+        self.assertIs(result, st1)
+        self.assertIs(obj._final_cache, st1)
+        self.assertEqual(len(obj), 2)
+
+    def test_final_multiple(self):
+        obj = automaton.Machine()
+        st1 = obj._new_state(True)
+        st2 = obj._new_state(True)
+
+        result = obj._final
+
+        self.assertIs(obj._final_cache, result)
+        self.assertEqual(obj._accepting, set([result]))
+        self.assertFalse(st1.accepting)
+        self.assertFalse(st2.accepting)
+        self.assertEqual(len(obj), 4)
+
+    def test_dfa(self):
+        nfa = automaton.Machine()
+        st1 = nfa._new_state()
+        st2 = nfa._new_state(True)
+        st3 = nfa._new_state(True)
+        nfa._start.transition(transitions.Epsilon, st1)
+        nfa._start.transition(transitions.MatchChar, st2,
+                              cset=charset.CharSet('a', 'c'))
+        st1.transition(transitions.MatchChar, st3,
+                       cset=charset.CharSet('b', 'd'))
+
+        result = nfa.dfa()
+
+        self.assertEqual(len(result), 4)
+        self.assertFalse(result._start.accepting)
+        trans = sorted(result._start.iter_out(), key=lambda t: str(t.cset))
+        self.assertEqual([str(t.cset) for t in trans], ['[a]', '[bc]', '[d]'])
+        for t in trans:
+            self.assertIs(t.state_out, result._start)
+            self.assertTrue(t.state_in.accepting)
+            self.assertEqual(list(t.state_in.iter_out()), [])
+        self.assertEqual(len(set(t.state_in for t in trans)), 3)
+
+
+class TestMatcher(unittest.TestCase):
+    def test_match_str(self):
+        result = automaton.Matcher.match_str('aba')
+
+        self.assertEqual(len(result), 4)
+        self.assertEqual(len(result._accepting), 1)
+        state = result._start
+        for char in 'aba':
+            self.assertFalse(state.accepting)
+            trans = list(state.iter_out())
+            self.assertEqual(len(trans), 1)
+            self.assertIsInstance(trans[0], transitions.MatchChar)
+            self.assertEqual(trans[0].cset, charset.CharSet(char))
+            state = trans[0].state_in
+        self.assertTrue(state.accepting)
+        self.assertIs(result._final_cache, state)
+
+    def test_concat(self):
+        obj = automaton.Matcher.match_cset('a')
+        other = automaton.Matcher.match_cset('b')
+        final = obj._final
+        other_final = other._final
+
+        result = obj.concat(other)
+
+        self.assertIs(result, obj)
+        self.assertEqual(len(obj), 4)
+        self.assertFalse(final.accepting)
+        self.assertEqual(obj._accepting, set([other_final]))
+        self.assertIs(obj._final_cache, other_final)
+        trans = list(final.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertIsInstance(trans[0], transitions.Epsilon)
+        self.assertIs(trans[0].state_in, other._start)
+
+    def test_concat_many(self):
+        obj = automaton.Matcher.match_cset('a')
+        machs = [
+            automaton.Matcher.match_cset('b'),
+            automaton.Matcher.match_cset('c'),
+        ]
+        finals = [obj._final] + [m._final for m in machs]
+        starts = [obj._start] + [m._start for m in machs]
+
+        result = obj._concat_many(machs)
+
+        self.assertIs(result, obj)
+        self.assertEqual(len(obj), 6)
+        self.assertEqual(obj._accepting, set([finals[2]]))
+        self.assertIs(obj._final, finals[2])
+        self.assertTrue(finals[2].accepting)
+        for final, start in zip(finals[:2], starts[1:]):
+            self.assertFalse(final.accepting)
+            trans = list(final.iter_out())
+            self.assertEqual(len(trans), 1)
+            self.assertIsInstance(trans[0], transitions.Epsilon)
+            self.assertIs(trans[0].state_in, start)
+
+    def test_concat_many_empty(self):
+        obj = automaton.Matcher.match_cset('a')
+        final = obj._final
+
+        result = obj._concat_many([])
+
+        self.assertIs(result, obj)
+        self.assertEqual(len(obj), 2)
+        self.assertEqual(obj._accepting, set([final]))
+
+    def test_alternate(self):
+        obj = automaton.Matcher.match_cset('a')
+        other = automaton.Matcher.match_cset('b')
+        other_start = other._start
+        other_final = other._final
+
+        result = obj.alternate(other)
+
+        self.assertIs(result, obj)
+        self.assertEqual(len(obj), 6)
+        self.assertEqual(len(obj._accepting), 1)
+        self.assertFalse(other_final.accepting)
+        trans = list(obj._start.iter_out())
+        self.assertEqual(len(trans), 2)
+        self.assertTrue(all(isinstance(t, transitions.Epsilon)
+                            for t in trans))
+        self.assertIn(other_start, set(t.state_in for t in trans))
+        trans = list(other_final.iter_out())
+        self.assertEqual(len(trans), 1)
+        self.assertIsInstance(trans[0], transitions.Epsilon)
+        self.assertIs(trans[0].state_in, obj._final)
+
+    def test_repeat_count(self):
+        obj = automaton.Matcher.match_cset('a')
+
+        result = obj.repeat(3)
+
+        self.assertIs(result, obj)
+        self.assertEqual(len(obj), 6)
+        self.assertEqual(len(obj._accepting), 1)
+        state = obj._start
+        for i in range(3):
+            trans = list(state.iter_out(1))
+            self.assertEqual(len(trans), 1)
+            self.assertEqual(trans[0].cset, charset.CharSet('a'))
+            state = trans[0].state_in
+            if i < 2:
+                trans = list(state.iter_out())
+                self.assertEqual(len(trans), 1)
+                self.assertIsInstance(trans[0], transitions.Epsilon)
+                state = trans[0].state_in
+        self.assertIs(state, obj._final)
+
+    def test_repeat_star(self):
+        obj = automaton.Matcher.match_cset('a')
+        start = obj._start
+        final = obj._final
+
+        result = obj.repeat('*')
+
+        self.assertIs(result, obj)
+        self.assertEqual(len(obj), 4)
+        trans = list(obj._start.iter_out())
+        self.assertEqual(len(trans), 2)
+        self.assertTrue(all(isinstance(t, transitions.Epsilon)
+                            for t in trans))
+        self.assertEqual(set(t.state_in for t in trans),
+                         set([start, obj._final]))
+        trans = list(final.iter_out())
+        self.assertEqual(len(trans), 2)
+        self.assertEqual(set(t.state_in for t in trans),
+                         set([start, obj._final]))
+
+    def test_repeat_list(self):
+        obj = automaton.Matcher.match_cset('a')
+
+        result = obj.repeat([1, 2])
+
+        self.assertIs(result, obj)
+        self.assertEqual(len(obj._accepting), 1)
+        self.assertEqual(len(list(obj._start.iter_out(1))), 1)
+
+    def test_repeat_bad_str(self):
+        obj = automaton.Matcher.match_cset('a')
+
+        self.assertRaises(TypeError, obj.repeat, 'x')
+
+    def test_repeat_bad_type(self):
+        obj = automaton.Matcher.match_cset('a')
+
+        self.assertRaises(TypeError, obj.repeat, 1.5)
+
+    def test_repeat_bad_bounds(self):
+        obj = automaton.Matcher.match_cset('a')
+
+        self.assertRaises(ValueError, obj.repeat, (-1, 2))
+        self.assertRaises(ValueError, obj.repeat, (2, 1))
+
+
+class TestLexer(unittest.TestCase):
+    def test_init(self):
+        result = automaton.Lexer()
+
+        self.assertTrue(result._start.accepting)
+        self.assertEqual(result._start.code, '')
+        self.assertEqual(result._start_codes, {'': result._start})
+        self.assertEqual(result._sorted_codes, [''])
+
+    def test_get_start_by_code(self):
+        obj = automaton.Lexer()
+
+        st_b = obj._get_start_by_code('b')
+        st_a = obj._get_start_by_code('a')
+        result = obj._get_start_by_code('b')
+
+        self.assertIs(result, st_b)
+        self.assertTrue(st_a.accepting)
+        self.assertEqual(st_a.code, 'a')
+        self.assertEqual(obj._start_codes, {
+            '': obj._start,
+            'a': st_a,
+            'b': st_b,
+        })
+        self.assertEqual(obj._sorted_codes, ['', 'a', 'b'])
+
+    def test_get_starts(self):
+        obj = automaton.Lexer()
+        st_c = obj._get_start_by_code('c')
+        st_a = obj._get_start_by_code('a')
+        st_b = obj._get_start_by_code('b')
+
+        result = obj._get_starts()
+
+        self.assertEqual(result, [obj._start, st_a, st_b, st_c])
@@ -1,11 +1,19 @@
 import unittest
 
 import mock
-import six
 
 from plexgen import charset
 
 
+class TestMakeRange(unittest.TestCase):
+    def test_make_range(self):
+        result = charset._make_range((97, 99))
+
+        self.assertIsInstance(result, charset.Range)
+        self.assertEqual(result.start, 97)
+        self.assertEqual(result.end, 99)
+
+
 class TestVChars(unittest.TestCase):
     def test_acceptable(self):
         # Ensure no exception is raised
@@ -24,9 +32,9 @@ class TestQChar(unittest.TestCase):
             result = charset._qchar(i)
 
             if i in charset.ESCAPED:
-                self.assertEqual(result, u'\\%s' % six.unichr(i))
+                self.assertEqual(result, u'\\%s' % chr(i))
             else:
-                self.assertEqual(result, six.unichr(i))
+                self.assertEqual(result, chr(i))
 
     def test_substitutions(self):
         for i in charset.SUBSTITUTE.keys():
@@ -39,6 +47,24 @@ class TestQChar(unittest.TestCase):
 
         self.assertEqual(result, u'\\x0f')
 
+    def test_8bit_high(self):
+        result = charset._qchar(0xff)
+
+        self.assertEqual(result, u'\\xff')
+
+    def test_ascii_table(self):
+        self.assertEqual(len(charset._QCHAR_ASCII), 0x80)
+        for i in range(0x80):
+            self.assertEqual(charset._QCHAR_ASCII[i],
+                             charset._qchar_compute(i))
+
+    @mock.patch.object(charset, '_qchar_compute', return_value='computed')
+    def test_ascii_uses_table(self, mock_qchar_compute):
+        result = charset._qchar(0x61)
+
+        self.assertEqual(result, u'a')
+        self.assertFalse(mock_qchar_compute.called)
+
     def test_16bit(self):
         result = charset._qchar(0x01ff)
 
@@ -67,6 +93,29 @@ class TestRngStr(unittest.TestCase):
         self.assertEqual(result, u'\\x7f-\\x81')
 
 
+class TestFromChars(unittest.TestCase):
+    def test_empty(self):
+        result = charset._from_chars([])
+
+        self.assertEqual(result, [])
+
+    def test_chars(self):
+        result = charset._from_chars([100, u'a', 99, u'c', 98, 120, u'a',
+                                      u'\u2026', 122])
+
+        self.assertEqual(result, [
+            charset.Range(97, 100),
+            charset.Range(120, 120),
+            charset.Range(122, 122),
+            charset.Range(8230, 8230),
+        ])
+        self.assertIsInstance(result[0], charset.Range)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, charset._from_chars,
+                          [97, charset.MAX_CHAR + 1])
+
+
 class TestSearchRanges(unittest.TestCase):
     def test_search_ranges_empty(self):
         ranges = []
@@ -185,6 +234,16 @@ class TestSearchRanges(unittest.TestCase):
 
         self.assertEqual(result, (2, False))
 
+    def test_search_ranges_long(self):
+        ranges = [charset.Range(i * 10, i * 10 + 4) for i in range(100)]
+
+        for item in range(0, 1000):
+            if item % 10 <= 4:
+                expected = (item // 10, True)
+            else:
+                expected = (item // 10 + 1, False)
+            self.assertEqual(charset._search_ranges(ranges, item), expected)
+
     def test_search_ranges_low_lo(self):
         ranges = [
             charset.Range(97, 99),
@@ -412,6 +471,45 @@ class TestAddRange(unittest.TestCase):
         ])
         self.assertFalse(mock_search_ranges.called)
 
+    @mock.patch.object(charset, '_search_ranges')
+    def test_append_empty(self, mock_search_ranges):
+        ranges = []
+
+        result = charset._add_range(ranges, 97, 99)
+
+        self.assertIs(result, ranges)
+        self.assertEqual(ranges, [
+            charset.Range(97, 99),
+        ])
+        self.assertFalse(mock_search_ranges.called)
+
+    @mock.patch.object(charset, '_search_ranges')
+    def test_append(self, mock_search_ranges):
+        ranges = [
+            charset.Range(97, 99),
+        ]
+
+        result = charset._add_range(ranges, 101, 103)
+
+        self.assertIs(result, ranges)
+        self.assertEqual(ranges, [
+            charset.Range(97, 99),
+            charset.Range(101, 103),
+        ])
+        self.assertFalse(mock_search_ranges.called)
+
+    def test_append_adjacent(self):
+        ranges = [
+            charset.Range(97, 99),
+        ]
+
+        result = charset._add_range(ranges, 100, 103)
+
+        self.assertIs(result, ranges)
+        self.assertEqual(ranges, [
+            charset.Range(97, 103),
+        ])
+
 
 class TestDiscardRange(unittest.TestCase):
     def test_uncontained(self):
@@ -538,6 +636,81 @@ class TestDiscardRange(unittest.TestCase):
         ])
         self.assertFalse(mock_search_ranges.called)
 
+    @mock.patch.object(charset, '_search_ranges')
+    def test_outside(self, mock_search_ranges):
+        ranges = [
+            charset.Range(97, 99),
+            charset.Range(101, 103),
+        ]
+
+        charset._discard_range(ranges, 90, 96)
+        charset._discard_range(ranges, 104, 110)
+        result = charset._discard_range([], 90, 96)
+
+        self.assertEqual(ranges, [
+            charset.Range(97, 99),
+            charset.Range(101, 103),
+        ])
+        self.assertEqual(result, [])
+        self.assertFalse(mock_search_ranges.called)
+
+
+class TestClip(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(charset._clip([], 97, 122), [])
+
+    def test_outside(self):
+        ranges = [
+            charset.Range(65, 90),
+            charset.Range(123, 125),
+        ]
+
+        self.assertEqual(charset._clip(ranges, 97, 122), [])
+
+    def test_inside(self):
+        ranges = (
+            charset.Range(65, 90),
+            charset.Range(100, 105),
+            charset.Range(110, 115),
+            charset.Range(123, 125),
+        )
+
+        result = charset._clip(ranges, 97, 122)
+
+        self.assertEqual(result, [
+            charset.Range(100, 105),
+            charset.Range(110, 115),
+        ])
+        self.assertIsInstance(result, list)
+
+    def test_trim(self):
+        ranges = [
+            charset.Range(65, 100),
+            charset.Range(105, 106),
+            charset.Range(110, 125),
+        ]
+
+        result = charset._clip(ranges, 97, 122)
+
+        self.assertEqual(result, [
+            charset.Range(97, 100),
+            charset.Range(105, 106),
+            charset.Range(110, 122),
+        ])
+        self.assertIs(type(result[0]), charset.Range)
+        self.assertIs(type(result[-1]), charset.Range)
+
+    def test_trim_single(self):
+        ranges = [
+            charset.Range(65, 125),
+        ]
+
+        result = charset._clip(ranges, 97, 122)
+
+        self.assertEqual(result, [
+            charset.Range(97, 122),
+        ])
+
 
 class TestInvert(unittest.TestCase):
     def test_invert_short(self):
@@ -547,7 +720,7 @@ class TestInvert(unittest.TestCase):
             charset.Range(118, 122),
         ]
 
-        result = list(charset._invert(ranges))
+        result = charset._invert(ranges)
 
         self.assertEqual(result, [
             charset.Range(0, 96),
@@ -564,7 +737,7 @@ class TestInvert(unittest.TestCase):
             charset.Range(123, charset.MAX_CHAR),
         ]
 
-        result = list(charset._invert(ranges))
+        result = charset._invert(ranges)
 
         self.assertEqual(result, [
             charset.Range(97, 104),
@@ -572,6 +745,87 @@ class TestInvert(unittest.TestCase):
             charset.Range(118, 122),
         ])
 
+    def test_invert_empty(self):
+        result = charset._invert([])
+
+        self.assertEqual(result, [
+            charset.Range(charset.MIN_CHAR, charset.MAX_CHAR),
+        ])
+
+    def test_invert_full(self):
+        result = charset._invert([
+            charset.Range(charset.MIN_CHAR, charset.MAX_CHAR),
+        ])
+
+        self.assertEqual(result, [])
+
+
+class TestMerge(unittest.TestCase):
+    def test_empty(self):
+        op = mock.Mock(return_value=True)
+
+        result = charset._merge([], [], op)
+
+        self.assertEqual(result, [])
+        self.assertFalse(op.called)
+
+    def test_op(self):
+        ranges1 = [
+            charset.Range(97, 106),
+        ]
+        ranges2 = [
+            charset.Range(100, 102),
+        ]
+        op = mock.Mock(side_effect=lambda a, b: a and b)
+
+        result = charset._merge(ranges1, ranges2, op)
+
+        self.assertEqual(result, [
+            charset.Range(100, 102),
+        ])
+        op.assert_has_calls([
+            mock.call(True, False),
+            mock.call(True, True),
+            mock.call(True, False),
+            mock.call(True, False),
+        ])
+        self.assertEqual(op.call_count, 4)
+
+    def test_tail(self):
+        ranges1 = [
+            charset.Range(97, 99),
+        ]
+        ranges2 = [
+            charset.Range(98, 102),
+            charset.Range(104, 106),
+            charset.Range(108, 110),
+        ]
+        op = mock.Mock(side_effect=lambda a, b: a or b)
+
+        result = charset._merge(ranges1, ranges2, op)
+
+        self.assertEqual(result, [
+            charset.Range(97, 102),
+            charset.Range(104, 106),
+            charset.Range(108, 110),
+        ])
+        self.assertEqual(op.call_count, 4)
+
+    def test_full_range(self):
+        ranges1 = [
+            charset.Range(charset.MIN_CHAR, 96),
+            charset.Range(98, charset.MAX_CHAR),
+        ]
+        ranges2 = [
+            charset.Range(97, 97),
+        ]
+
+        result = charset._merge(ranges1, ranges2, charset.operator.or_)
+
+        self.assertEqual(result, [
+            charset.Range(charset.MIN_CHAR, charset.MAX_CHAR),
+        ])
+
 
 class TestIntersection(unittest.TestCase):
     def test_short_long(self):
@@ -612,6 +866,84 @@ class TestIntersection(unittest.TestCase):
             charset.Range(117, 122),
         ])
 
+    def test_disjoint(self):
+        ranges1 = [
+            charset.Range(97, 99),
+            charset.Range(110, 112),
+        ]
+        ranges2 = [
+            charset.Range(100, 109),
+            charset.Range(113, 122),
+        ]
+
+        result = charset._intersection(ranges1, ranges2)
+
+        self.assertEqual(result, [])
+
+    def test_spanning(self):
+        ranges1 = [
+            charset.Range(97, 122),
+        ]
+        ranges2 = [
+            charset.Range(65, 90),
+            charset.Range(98, 99),
+            charset.Range(101, 102),
+            charset.Range(120, 127),
+        ]
+
+        result = charset._intersection(ranges1, ranges2)
+
+        self.assertEqual(result, [
+            charset.Range(98, 99),
+            charset.Range(101, 102),
+            charset.Range(120, 122),
+        ])
+
+    def test_empty(self):
+        ranges = [
+            charset.Range(97, 99),
+        ]
+
+        self.assertEqual(charset._intersection(ranges, []), [])
+        self.assertEqual(charset._intersection([], ranges), [])
+
+    @mock.patch.object(charset, '_merge')
+    def test_envelope(self, mock_merge):
+        ranges1 = [
+            charset.Range(97, 99),
+        ]
+        ranges2 = [
+            charset.Range(98, 100),
+        ]
+
+        result = charset._intersection(ranges1, [charset.Range(101, 102)])
+
+        self.assertEqual(result, [])
+        result = charset._intersection([charset.Range(101, 102)], ranges2)
+
+        self.assertEqual(result, [])
+        self.assertFalse(mock_merge.called)
+
+    @mock.patch.object(charset, '_clip', return_value='clipped')
+    def test_single(self, mock_clip):
+        ranges1 = [
+            charset.Range(97, 99),
+            charset.Range(101, 103),
+        ]
+        ranges2 = [
+            charset.Range(98, 102),
+        ]
+
+        result1 = charset._intersection(ranges1, ranges2)
+        result2 = charset._intersection(ranges2, ranges1)
+
+        self.assertEqual(result1, 'clipped')
+        self.assertEqual(result2, 'clipped')
+        mock_clip.assert_has_calls([
+            mock.call(ranges1, 98, 102),
+            mock.call(ranges1, 98, 102),
+        ])
+
 
 class TestUnion(unittest.TestCase):
     def test_short_long(self):
@@ -650,6 +982,112 @@ class TestUnion(unittest.TestCase):
             charset.Range(110, 122),
         ])
 
+    def test_adjacent(self):
+        ranges1 = [
+            charset.Range(97, 99),
+            charset.Range(110, 112),
+        ]
+        ranges2 = [
+            charset.Range(100, 102),
+            charset.Range(120, 122),
+        ]
+
+        result = charset._union(ranges1, ranges2)
+
+        self.assertEqual(result, [
+            charset.Range(97, 102),
+            charset.Range(110, 112),
+            charset.Range(120, 122),
+        ])
+
+    def test_tail(self):
+        ranges1 = [
+            charset.Range(97, 99),
+            charset.Range(101, 110),
+        ]
+        ranges2 = (
+            charset.Range(98, 99),
+            charset.Range(103, 104),
+            charset.Range(106, 107),
+            charset.Range(111, 112),
+            charset.Range(115, 116),
+            charset.Range(118, 119),
+        )
+
+        result = charset._union(ranges1, ranges2)
+
+        self.assertEqual(result, [
+            charset.Range(97, 99),
+            charset.Range(101, 112),
+            charset.Range(115, 116),
+            charset.Range(118, 119),
+        ])
+
+    def test_empty(self):
+        ranges = [
+            charset.Range(97, 99),
+        ]
+
+        self.assertEqual(charset._union([], []), [])
+        self.assertEqual(charset._union(ranges, []), ranges)
+        self.assertEqual(charset._union([], ranges), ranges)
+
+    def test_before(self):
+        ranges1 = [
+            charset.Range(97, 99),
+        ]
+        ranges2 = (
+            charset.Range(101, 102),
+            charset.Range(110, 112),
+        )
+
+        result = charset._union(ranges1, ranges2)
+
+        self.assertEqual(result, [
+            charset.Range(97, 99),
+            charset.Range(101, 102),
+            charset.Range(110, 112),
+        ])
+        self.assertIsInstance(result, list)
+        self.assertIsNot(result, ranges1)
+
+    def test_after(self):
+        ranges1 = [
+            charset.Range(110, 112),
+        ]
+        ranges2 = [
+            charset.Range(97, 99),
+            charset.Range(101, 102),
+        ]
+
+        result = charset._union(ranges1, ranges2)
+
+        self.assertEqual(result, [
+            charset.Range(97, 99),
+            charset.Range(101, 102),
+            charset.Range(110, 112),
+        ])
+
+    @mock.patch.object(charset, '_add_range', return_value='added')
+    def test_single(self, mock_add_range):
+        ranges1 = (
+            charset.Range(97, 99),
+            charset.Range(101, 103),
+        )
+        ranges2 = [
+            charset.Range(98, 102),
+        ]
+
+        result1 = charset._union(ranges1, ranges2)
+        result2 = charset._union(ranges2, ranges1)
+
+        self.assertEqual(result1, 'added')
+        self.assertEqual(result2, 'added')
+        mock_add_range.assert_has_calls([
+            mock.call(list(ranges1), 98, 102),
+            mock.call(list(ranges1), 98, 102),
+        ])
+
 
 class TestDifference(unittest.TestCase):
     def test_short_long(self):
@@ -683,10 +1121,64 @@ class TestDifference(unittest.TestCase):
 
         result = charset._difference(ranges1, ranges2)
 
-        self.assertEqual(result, [
-            charset.Range(107, 107),
-            charset.Range(110, 110),
-        ])
+        self.assertEqual(result, [
+            charset.Range(107, 107),
+            charset.Range(110, 110),
+        ])
+
+    @mock.patch.object(charset, '_merge')
+    def test_envelope(self, mock_merge):
+        ranges1 = (
+            charset.Range(97, 99),
+            charset.Range(104, 106),
+        )
+        ranges2 = [
+            charset.Range(107, 109),
+        ]
+
+        result = charset._difference(ranges1, ranges2)
+
+        self.assertEqual(result, list(ranges1))
+        self.assertIsInstance(result, list)
+        self.assertFalse(mock_merge.called)
+
+    def test_straddle(self):
+        ranges1 = [
+            charset.Range(97, 102),
+            charset.Range(104, 110),
+            charset.Range(115, 120),
+        ]
+        ranges2 = [
+            charset.Range(98, 98),
+            charset.Range(100, 105),
+            charset.Range(107, 107),
+            charset.Range(110, 116),
+        ]
+
+        result = charset._difference(ranges1, ranges2)
+
+        self.assertEqual(result, [
+            charset.Range(97, 97),
+            charset.Range(99, 99),
+            charset.Range(106, 106),
+            charset.Range(108, 109),
+            charset.Range(117, 120),
+        ])
+
+    @mock.patch.object(charset, '_discard_range', return_value='discarded')
+    def test_single(self, mock_discard_range):
+        ranges1 = (
+            charset.Range(97, 99),
+            charset.Range(101, 103),
+        )
+        ranges2 = [
+            charset.Range(98, 102),
+        ]
+
+        result = charset._difference(ranges1, ranges2)
+
+        self.assertEqual(result, 'discarded')
+        mock_discard_range.assert_called_once_with(list(ranges1), 98, 102)
 
 
 class TestSymDifference(unittest.TestCase):
@@ -730,6 +1222,22 @@ class TestSymDifference(unittest.TestCase):
             charset.Range(116, 116),
         ])
 
+    @mock.patch.object(charset, '_merge')
+    @mock.patch.object(charset, '_union')
+    def test_envelope(self, mock_union, mock_merge):
+        ranges1 = [
+            charset.Range(97, 99),
+        ]
+        ranges2 = [
+            charset.Range(100, 102),
+        ]
+
+        result = charset._sym_difference(ranges1, ranges2)
+
+        self.assertEqual(result, mock_union.return_value)
+        mock_union.assert_called_once_with(ranges1, ranges2)
+        self.assertFalse(mock_merge.called)
+
 
 class TestIsDisjoint(unittest.TestCase):
     def test_short_long_overlap(self):
@@ -792,6 +1300,40 @@ class TestIsDisjoint(unittest.TestCase):
 
         self.assertTrue(result)
 
+    def test_empty(self):
+        ranges = [
+            charset.Range(97, 106),
+        ]
+
+        self.assertTrue(charset._isdisjoint([], ranges))
+        self.assertTrue(charset._isdisjoint(ranges, []))
+
+    def test_adjacent(self):
+        ranges1 = [
+            charset.Range(97, 99),
+            charset.Range(110, 112),
+        ]
+        ranges2 = [
+            charset.Range(100, 109),
+            charset.Range(113, 120),
+        ]
+
+        self.assertTrue(charset._isdisjoint(ranges1, ranges2))
+        self.assertTrue(charset._isdisjoint(ranges2, ranges1))
+
+    def test_overlap_last(self):
+        ranges1 = [
+            charset.Range(97, 99),
+            charset.Range(110, 112),
+        ]
+        ranges2 = [
+            charset.Range(100, 109),
+            charset.Range(112, 120),
+        ]
+
+        self.assertFalse(charset._isdisjoint(ranges1, ranges2))
+        self.assertFalse(charset._isdisjoint(ranges2, ranges1))
+
 
 class CharSetForTest(charset.BaseCharSet):
     def __init__(self, ranges):
@@ -812,26 +1354,79 @@ class TestBaseCharSet(unittest.TestCase):
         result = list(CharSetForTest.disjoint(*csets))
 
         self.assertEqual([i[1] for i in result], [
-            [csets[2], csets[0], csets[1]],            # 0-1
-            [csets[2], csets[3], csets[0], csets[1]],  # 2-3
-            [csets[3], csets[0], csets[1]],            # 4-4
+            [csets[0], csets[1], csets[2]],            # 0-1
+            [csets[0], csets[1], csets[2], csets[3]],  # 2-3
+            [csets[0], csets[1], csets[3]],            # 4-4
             [csets[0], csets[1]],                      # 5-5
             [csets[4]],                                # 7-9
         ])
         mock_init.assert_has_calls([
-            mock.call(0, 1),
-            mock.call(2, 3),
-            mock.call(4, 4),
-            mock.call(5, 5),
-            mock.call(7, 9),
+            mock.call(None, [charset.Range(0, 1)]),
+            mock.call(None, [charset.Range(2, 3)]),
+            mock.call(None, [charset.Range(4, 4)]),
+            mock.call(None, [charset.Range(5, 5)]),
+            mock.call(None, [charset.Range(7, 9)]),
         ])
         self.assertEqual(mock_init.call_count, 5)
 
+    @mock.patch.object(CharSetForTest, '__init__', return_value=None)
+    def test_disjoint_multiple_ranges(self, mock_init):
+        csets = [
+            mock.Mock(ranges=[charset.Range(0, 2), charset.Range(6, 9)]),
+            mock.Mock(ranges=[charset.Range(3, 7)]),
+            mock.Mock(ranges=[]),
+        ]
+
+        result = list(CharSetForTest.disjoint(*csets))
+
+        self.assertEqual([i[1] for i in result], [
+            [csets[0]],            # 0-2
+            [csets[1]],            # 3-5
+            [csets[0], csets[1]],  # 6-7
+            [csets[0]],            # 8-9
+        ])
+        mock_init.assert_has_calls([
+            mock.call(None, [charset.Range(0, 2)]),
+            mock.call(None, [charset.Range(3, 5)]),
+            mock.call(None, [charset.Range(6, 7)]),
+            mock.call(None, [charset.Range(8, 9)]),
+        ])
+        self.assertEqual(mock_init.call_count, 4)
+
+    @mock.patch.object(CharSetForTest, '__init__', return_value=None)
+    def test_disjoint_indexes(self, mock_init):
+        csets = [
+            mock.Mock(ranges=[charset.Range(0, 5)]),
+            mock.Mock(ranges=[charset.Range(2, 4)]),
+        ]
+
+        result = list(CharSetForTest.disjoint_indexes(
+            csets[0], csets[1], csets[0]))
+
+        self.assertEqual([i[1] for i in result], [
+            [0, 2],     # 0-1
+            [0, 1, 2],  # 2-4
+            [0, 2],     # 5-5
+        ])
+        mock_init.assert_has_calls([
+            mock.call(None, [charset.Range(0, 1)]),
+            mock.call(None, [charset.Range(2, 4)]),
+            mock.call(None, [charset.Range(5, 5)]),
+        ])
+        self.assertEqual(mock_init.call_count, 3)
+
+    def test_disjoint_empty(self):
+        result = list(CharSetForTest.disjoint())
+
+        self.assertEqual(result, [])
+
     def test_init(self):
         obj = CharSetForTest('ranges')
 
         self.assertEqual(obj.ranges, 'ranges')
         self.assertIsNone(obj._len_cache)
+        self.assertIsNone(obj._latin1_cache)
+        self.assertIsNone(obj._str_cache)
 
     @mock.patch.object(charset.BaseCharSet, '__contains__', return_value=False)
     @mock.patch.object(charset.BaseCharSet, '__len__', return_value=0)
@@ -877,6 +1472,27 @@ class TestBaseCharSet(unittest.TestCase):
 
         self.assertEqual(str(obj), u'[a-cf-h]')
 
+    @mock.patch.object(charset.BaseCharSet, '__len__', return_value=3)
+    def test_str_cached(self, mock_len):
+        obj = CharSetForTest([
+            charset.Range(97, 99),
+        ])
+
+        result1 = str(obj)
+        result2 = str(obj)
+
+        self.assertEqual(result1, u'[a-c]')
+        self.assertEqual(result2, u'[a-c]')
+        self.assertEqual(obj._str_cache, u'[a-c]')
+        mock_len.assert_called_once_with()
+
+    def test_str_invalidate(self):
+        obj = charset.CharSet('a', 'c')
+
+        self.assertEqual(str(obj), u'[a-c]')
+        obj.add(u'e')
+        self.assertEqual(str(obj), u'[a-ce]')
+
     @mock.patch.object(charset, '_search_ranges',
                        return_value=(1, True))
     def test_contains_char(self, mock_search_ranges):
@@ -892,10 +1508,69 @@ class TestBaseCharSet(unittest.TestCase):
     def test_contains_int(self, mock_search_ranges):
         obj = CharSetForTest([])
 
-        result = obj.__contains__(97)
+        result = obj.__contains__(8230)
 
         self.assertIs(result, True)
-        mock_search_ranges.assert_called_once_with(obj.ranges, 97)
+        mock_search_ranges.assert_called_once_with(obj.ranges, 8230)
+
+    @mock.patch.object(charset, '_search_ranges',
+                       return_value=(1, True))
+    def test_contains_single(self, mock_search_ranges):
+        obj = CharSetForTest([
+            charset.Range(97, 99),
+        ])
+
+        for char, expected in [(u'`', False), (u'a', True), (u'b', True),
+                               (u'c', True), (u'd', False), (98, True),
+                               (u'\u2026', False)]:
+            self.assertIs(obj.__contains__(char), expected)
+        self.assertIsNone(obj._latin1_cache)
+        self.assertFalse(mock_search_ranges.called)
+
+    @mock.patch.object(charset, '_search_ranges',
+                       return_value=(1, True))
+    def test_contains_latin1(self, mock_search_ranges):
+        obj = CharSetForTest([
+            charset.Range(0, 0),
+            charset.Range(97, 99),
+            charset.Range(126, 200),
+            charset.Range(250, 300),
+        ])
+
+        for char, expected in [(u'\0', True), (u'\x01', False),
+                               (u'`', False), (u'a', True), (u'c', True),
+                               (u'd', False), (u'}', False), (u'~', True),
+                               (127, True), (200, True), (201, False),
+                               (255, True)]:
+            self.assertIs(obj.__contains__(char), expected)
+        self.assertEqual(
+            obj._latin1_cache,
+            b'\x01' + b'\0' * 96 + b'\x01' * 3 + b'\0' * 26 +
+            b'\x01' * 75 + b'\0' * 49 + b'\x01' * 6,
+        )
+        self.assertFalse(mock_search_ranges.called)
+
+    @mock.patch.object(charset, '_search_ranges',
+                       return_value=(1, True))
+    def test_contains_latin1_cached(self, mock_search_ranges):
+        obj = CharSetForTest([])
+        obj._latin1_cache = b'\0' * 97 + b'\x01' + b'\0' * 158
+
+        self.assertIs(obj.__contains__(u'a'), True)
+        self.assertIs(obj.__contains__(u'b'), False)
+        self.assertFalse(mock_search_ranges.called)
+
+    def test_invalidate(self):
+        obj = CharSetForTest([])
+        obj._len_cache = 5
+        obj._latin1_cache = 7
+        obj._str_cache = u'[]'
+
+        obj._invalidate()
+
+        self.assertIsNone(obj._len_cache)
+        self.assertIsNone(obj._latin1_cache)
+        self.assertIsNone(obj._str_cache)
 
     def test_iter(self):
         obj = CharSetForTest([
@@ -910,6 +1585,30 @@ class TestBaseCharSet(unittest.TestCase):
             u'\u2026', u'\u2027', u'\u2028',
         ])
 
+    def test_iter_empty(self):
+        obj = CharSetForTest([])
+
+        result = list(obj.__iter__())
+
+        self.assertEqual(result, [])
+
+    def test_as_text(self):
+        obj = CharSetForTest([
+            charset.Range(97, 99),
+            charset.Range(8230, 8232),
+        ])
+
+        result = obj.as_text()
+
+        self.assertEqual(result, u'abc\u2026\u2027\u2028')
+
+    def test_as_text_empty(self):
+        obj = CharSetForTest([])
+
+        result = obj.as_text()
+
+        self.assertEqual(result, u'')
+
     def test_len_empty_uncached(self):
         obj = CharSetForTest([])
 
@@ -952,6 +1651,19 @@ class TestBaseCharSet(unittest.TestCase):
 
         self.assertTrue(result)
 
+    def test_eq_list_tuple(self):
+        obj1 = CharSetForTest([
+            charset.Range(97, 102),
+            charset.Range(104, 108),
+        ])
+        obj2 = CharSetForTest((
+            charset.Range(97, 102),
+            charset.Range(104, 108),
+        ))
+
+        self.assertTrue(obj1.__eq__(obj2))
+        self.assertFalse(obj1.__ne__(obj2))
+
     def test_eq_altlength(self):
         obj1 = CharSetForTest([
             charset.Range(97, 102),
@@ -1407,7 +2119,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_invert.assert_called_once_with('ranges')
         mock_init.assert_called_once_with(None, 'inverted')
 
-    @mock.patch.object(charset.collections.Set, '__and__')
+    @mock.patch.object(charset.collections.abc.Set, '__and__')
     @mock.patch.object(charset, '_intersection')
     def test_and_equal(self, mock_intersection, mock_and):
         obj1 = CharSetForTest([
@@ -1428,7 +2140,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_init.assert_called_once_with(obj1)
         self.assertFalse(mock_and.called)
 
-    @mock.patch.object(charset.collections.Set, '__and__')
+    @mock.patch.object(charset.collections.abc.Set, '__and__')
     @mock.patch.object(charset, '_intersection')
     def test_and_unequal(self, mock_intersection, mock_and):
         obj1 = CharSetForTest([
@@ -1450,7 +2162,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_init.assert_called_once_with(None, mock_intersection.return_value)
         self.assertFalse(mock_and.called)
 
-    @mock.patch.object(charset.collections.Set, '__and__')
+    @mock.patch.object(charset.collections.abc.Set, '__and__')
     @mock.patch.object(charset, '_intersection')
     def test_and_other(self, mock_intersection, mock_and):
         obj1 = CharSetForTest([
@@ -1468,7 +2180,7 @@ class TestBaseCharSet(unittest.TestCase):
         self.assertFalse(mock_init.called)
         mock_and.assert_called_once_with('other')
 
-    @mock.patch.object(charset.collections.Set, '__or__')
+    @mock.patch.object(charset.collections.abc.Set, '__or__')
     @mock.patch.object(charset, '_union')
     def test_or_equal(self, mock_union, mock_or):
         obj1 = CharSetForTest([
@@ -1489,7 +2201,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_init.assert_called_once_with(obj1)
         self.assertFalse(mock_or.called)
 
-    @mock.patch.object(charset.collections.Set, '__or__')
+    @mock.patch.object(charset.collections.abc.Set, '__or__')
     @mock.patch.object(charset, '_union')
     def test_or_unequal(self, mock_union, mock_or):
         obj1 = CharSetForTest([
@@ -1511,7 +2223,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_init.assert_called_once_with(None, mock_union.return_value)
         self.assertFalse(mock_or.called)
 
-    @mock.patch.object(charset.collections.Set, '__or__')
+    @mock.patch.object(charset.collections.abc.Set, '__or__')
     @mock.patch.object(charset, '_union')
     def test_or_other(self, mock_union, mock_or):
         obj1 = CharSetForTest([
@@ -1529,7 +2241,7 @@ class TestBaseCharSet(unittest.TestCase):
         self.assertFalse(mock_init.called)
         mock_or.assert_called_once_with('other')
 
-    @mock.patch.object(charset.collections.Set, '__sub__')
+    @mock.patch.object(charset.collections.abc.Set, '__sub__')
     @mock.patch.object(charset, '_difference')
     def test_sub_equal(self, mock_difference, mock_sub):
         obj1 = CharSetForTest([
@@ -1550,7 +2262,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_init.assert_called_once_with()
         self.assertFalse(mock_sub.called)
 
-    @mock.patch.object(charset.collections.Set, '__sub__')
+    @mock.patch.object(charset.collections.abc.Set, '__sub__')
     @mock.patch.object(charset, '_difference')
     def test_sub_unequal(self, mock_difference, mock_sub):
         obj1 = CharSetForTest([
@@ -1572,7 +2284,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_init.assert_called_once_with(None, mock_difference.return_value)
         self.assertFalse(mock_sub.called)
 
-    @mock.patch.object(charset.collections.Set, '__sub__')
+    @mock.patch.object(charset.collections.abc.Set, '__sub__')
     @mock.patch.object(charset, '_difference')
     def test_sub_other(self, mock_difference, mock_sub):
         obj1 = CharSetForTest([
@@ -1590,7 +2302,7 @@ class TestBaseCharSet(unittest.TestCase):
         self.assertFalse(mock_init.called)
         mock_sub.assert_called_once_with('other')
 
-    @mock.patch.object(charset.collections.Set, '__xor__')
+    @mock.patch.object(charset.collections.abc.Set, '__xor__')
     @mock.patch.object(charset, '_sym_difference')
     def test_xor_equal(self, mock_sym_difference, mock_xor):
         obj1 = CharSetForTest([
@@ -1611,7 +2323,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_init.assert_called_once_with()
         self.assertFalse(mock_xor.called)
 
-    @mock.patch.object(charset.collections.Set, '__xor__')
+    @mock.patch.object(charset.collections.abc.Set, '__xor__')
     @mock.patch.object(charset, '_sym_difference')
     def test_xor_unequal(self, mock_sym_difference, mock_xor):
         obj1 = CharSetForTest([
@@ -1634,7 +2346,7 @@ class TestBaseCharSet(unittest.TestCase):
             None, mock_sym_difference.return_value)
         self.assertFalse(mock_xor.called)
 
-    @mock.patch.object(charset.collections.Set, '__xor__')
+    @mock.patch.object(charset.collections.abc.Set, '__xor__')
     @mock.patch.object(charset, '_sym_difference')
     def test_xor_other(self, mock_sym_difference, mock_xor):
         obj1 = CharSetForTest([
@@ -1694,7 +2406,44 @@ class TestBaseCharSet(unittest.TestCase):
 
         self.assertFalse(result)
 
-    @mock.patch.object(charset.collections.Set, 'isdisjoint')
+    def test_issubset_empty(self):
+        obj1 = CharSetForTest([])
+        obj2 = CharSetForTest([
+            charset.Range(98, 101),
+        ])
+
+        self.assertTrue(obj1._issubset(obj2))
+        self.assertFalse(obj2._issubset(obj1))
+
+    def test_issubset_past_end(self):
+        obj1 = CharSetForTest([
+            charset.Range(97, 98),
+            charset.Range(110, 112),
+        ])
+        obj2 = CharSetForTest([
+            charset.Range(96, 102),
+            charset.Range(104, 108),
+        ])
+
+        result = obj1._issubset(obj2)
+
+        self.assertFalse(result)
+
+    def test_issubset_skip(self):
+        obj1 = CharSetForTest([
+            charset.Range(110, 112),
+        ])
+        obj2 = CharSetForTest([
+            charset.Range(96, 102),
+            charset.Range(104, 108),
+            charset.Range(110, 115),
+        ])
+
+        result = obj1._issubset(obj2)
+
+        self.assertTrue(result)
+
+    @mock.patch.object(charset.collections.abc.Set, 'isdisjoint')
     @mock.patch.object(charset, '_isdisjoint', return_value='disjoint')
     def test_isdisjoint_charset(self, mock_cs_isdisjoint, mock_set_isdisjoint):
         obj1 = CharSetForTest([
@@ -1712,7 +2461,7 @@ class TestBaseCharSet(unittest.TestCase):
         mock_cs_isdisjoint.assert_called_once_with(obj1.ranges, obj2.ranges)
         self.assertFalse(mock_set_isdisjoint.called)
 
-    @mock.patch.object(charset.collections.Set, 'isdisjoint')
+    @mock.patch.object(charset.collections.abc.Set, 'isdisjoint')
     @mock.patch.object(charset, '_isdisjoint', return_value='disjoint')
     def test_isdisjoint_other(self, mock_cs_isdisjoint, mock_set_isdisjoint):
         obj1 = CharSetForTest([
@@ -1804,26 +2553,28 @@ class TestCharSet(unittest.TestCase):
     @mock.patch.object(charset.CharSet, 'add')
     def test_init_charset(self, mock_add):
         obj = CharSetForTest('ranges')
+        obj._len_cache = 'len'
+        obj._latin1_cache = 'ascii'
+        obj._str_cache = 'str'
 
         result = charset.CharSet(obj)
 
         self.assertEqual(result.ranges, ['r', 'a', 'n', 'g', 'e', 's'])
+        self.assertEqual(result._len_cache, 'len')
+        self.assertEqual(result._latin1_cache, 'ascii')
+        self.assertEqual(result._str_cache, 'str')
         self.assertFalse(mock_add.called)
 
+    @mock.patch.object(charset, '_from_chars', return_value=['ranges'])
     @mock.patch.object(charset.CharSet, 'add')
-    def test_init_seq(self, mock_add):
+    def test_init_seq(self, mock_add, mock_from_chars):
         result = charset.CharSet([5, 10, 15])
 
-        # Since we mock out .add()
-        self.assertEqual(result.ranges, [])
-        mock_add.assert_has_calls([
-            mock.call(5),
-            mock.call(10),
-            mock.call(15),
-        ])
-        self.assertEqual(mock_add.call_count, 3)
+        self.assertEqual(result.ranges, ['ranges'])
+        mock_from_chars.assert_called_once_with([5, 10, 15])
+        self.assertFalse(mock_add.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__iand__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__iand__')
     @mock.patch.object(charset, '_intersection')
     def test_iand_equal(self, mock_intersection, mock_iand):
         ranges1 = [
@@ -1845,7 +2596,7 @@ class TestCharSet(unittest.TestCase):
         self.assertEqual(obj1._len_cache, 'len')
         self.assertFalse(mock_iand.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__iand__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__iand__')
     @mock.patch.object(charset, '_intersection')
     def test_iand_unequal(self, mock_intersection, mock_iand):
         ranges1 = [
@@ -1868,7 +2619,7 @@ class TestCharSet(unittest.TestCase):
         self.assertIsNone(obj1._len_cache)
         self.assertFalse(mock_iand.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__iand__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__iand__')
     @mock.patch.object(charset, '_intersection')
     def test_iand_other(self, mock_intersection, mock_iand):
         ranges1 = [
@@ -1886,7 +2637,7 @@ class TestCharSet(unittest.TestCase):
         self.assertEqual(obj1._len_cache, 'len')
         mock_iand.assert_called_once_with('other')
 
-    @mock.patch.object(charset.collections.MutableSet, '__ior__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__ior__')
     @mock.patch.object(charset, '_union')
     def test_ior_equal(self, mock_union, mock_ior):
         ranges1 = [
@@ -1908,7 +2659,7 @@ class TestCharSet(unittest.TestCase):
         self.assertEqual(obj1._len_cache, 'len')
         self.assertFalse(mock_ior.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__ior__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__ior__')
     @mock.patch.object(charset, '_union')
     def test_ior_unequal(self, mock_union, mock_ior):
         ranges1 = [
@@ -1931,25 +2682,43 @@ class TestCharSet(unittest.TestCase):
         self.assertIsNone(obj1._len_cache)
         self.assertFalse(mock_ior.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__ior__')
-    @mock.patch.object(charset, '_union')
-    def test_ior_other(self, mock_union, mock_ior):
+    @mock.patch.object(charset.collections.abc.MutableSet, '__ior__')
+    def test_ior_other(self, mock_ior):
         ranges1 = [
             charset.Range(97, 102),
             charset.Range(104, 108),
         ]
         obj1 = charset.CharSet(None, ranges1)
         obj1._len_cache = 'len'
-        obj2 = 'other'
+        obj2 = ['z', 103, 'x', 'y']
 
         result = obj1.__ior__(obj2)
 
-        self.assertIs(result, mock_ior.return_value)
-        self.assertFalse(mock_union.called)
+        self.assertIs(result, obj1)
+        self.assertEqual(obj1.ranges, [
+            charset.Range(97, 108),
+            charset.Range(120, 122),
+        ])
+        self.assertIsNone(obj1._len_cache)
+        self.assertFalse(mock_ior.called)
+
+    @mock.patch.object(charset, '_union')
+    def test_ior_other_empty(self, mock_union):
+        ranges1 = [
+            charset.Range(97, 102),
+            charset.Range(104, 108),
+        ]
+        obj1 = charset.CharSet(None, ranges1)
+        obj1._len_cache = 'len'
+
+        result = obj1.__ior__([])
+
+        self.assertIs(result, obj1)
+        self.assertEqual(obj1.ranges, ranges1)
         self.assertEqual(obj1._len_cache, 'len')
-        mock_ior.assert_called_once_with('other')
+        self.assertFalse(mock_union.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__isub__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__isub__')
     @mock.patch.object(charset, '_difference')
     def test_isub_equal(self, mock_difference, mock_isub):
         ranges1 = [
@@ -1971,7 +2740,7 @@ class TestCharSet(unittest.TestCase):
         self.assertIsNone(obj1._len_cache)
         self.assertFalse(mock_isub.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__isub__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__isub__')
     @mock.patch.object(charset, '_difference')
     def test_isub_unequal(self, mock_difference, mock_isub):
         ranges1 = [
@@ -1994,25 +2763,41 @@ class TestCharSet(unittest.TestCase):
         self.assertIsNone(obj1._len_cache)
         self.assertFalse(mock_isub.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__isub__')
-    @mock.patch.object(charset, '_difference')
-    def test_isub_other(self, mock_difference, mock_isub):
+    @mock.patch.object(charset.collections.abc.MutableSet, '__isub__')
+    def test_isub_other(self, mock_isub):
         ranges1 = [
             charset.Range(97, 102),
             charset.Range(104, 108),
         ]
         obj1 = charset.CharSet(None, ranges1)
         obj1._len_cache = 'len'
-        obj2 = 'other'
+        obj2 = ['b', 106, 'c', 'z']
 
         result = obj1.__isub__(obj2)
 
-        self.assertIs(result, mock_isub.return_value)
-        self.assertFalse(mock_difference.called)
+        self.assertIs(result, obj1)
+        self.assertEqual(obj1.ranges, [
+            charset.Range(97, 97),
+            charset.Range(100, 102),
+            charset.Range(104, 105),
+            charset.Range(107, 108),
+        ])
+        self.assertIsNone(obj1._len_cache)
+        self.assertFalse(mock_isub.called)
+
+    @mock.patch.object(charset, '_difference')
+    def test_isub_other_empty(self, mock_difference):
+        obj1 = charset.CharSet()
+        obj1._len_cache = 'len'
+
+        result = obj1.__isub__('abc')
+
+        self.assertIs(result, obj1)
+        self.assertEqual(obj1.ranges, [])
         self.assertEqual(obj1._len_cache, 'len')
-        mock_isub.assert_called_once_with('other')
+        self.assertFalse(mock_difference.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__ixor__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__ixor__')
     @mock.patch.object(charset, '_sym_difference')
     def test_ixor_equal(self, mock_sym_difference, mock_ixor):
         ranges1 = [
@@ -2034,7 +2819,7 @@ class TestCharSet(unittest.TestCase):
         self.assertIsNone(obj1._len_cache)
         self.assertFalse(mock_ixor.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__ixor__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__ixor__')
     @mock.patch.object(charset, '_sym_difference')
     def test_ixor_unequal(self, mock_sym_difference, mock_ixor):
         ranges1 = [
@@ -2057,7 +2842,7 @@ class TestCharSet(unittest.TestCase):
         self.assertIsNone(obj1._len_cache)
         self.assertFalse(mock_ixor.called)
 
-    @mock.patch.object(charset.collections.MutableSet, '__ixor__')
+    @mock.patch.object(charset.collections.abc.MutableSet, '__ixor__')
     @mock.patch.object(charset, '_sym_difference')
     def test_ixor_other(self, mock_sym_difference, mock_ixor):
         ranges1 = [
@@ -2112,6 +2897,74 @@ class TestCharSet(unittest.TestCase):
         mock_add_range.assert_called_once_with(
             obj.ranges, 8230, 8230, (0, False), (0, False))
 
+    def test_add_range_str(self):
+        obj = charset.CharSet(None, [
+            charset.Range(97, 99),
+            charset.Range(110, 112),
+        ])
+        obj._len_cache = 'len'
+
+        obj.add_range(u'd', u'l')
+
+        self.assertEqual(obj.ranges, [
+            charset.Range(97, 108),
+            charset.Range(110, 112),
+        ])
+        self.assertIsNone(obj._len_cache)
+
+    def test_add_range_int(self):
+        obj = charset.CharSet(None, [
+            charset.Range(97, 99),
+            charset.Range(110, 112),
+        ])
+
+        obj.add_range(100, 109)
+
+        self.assertEqual(obj.ranges, [
+            charset.Range(97, 112),
+        ])
+
+    @mock.patch.object(charset, '_add_range')
+    def test_add_range_contained(self, mock_add_range):
+        obj = charset.CharSet(None, [
+            charset.Range(97, 99),
+            charset.Range(110, 122),
+        ])
+        obj._len_cache = 'len'
+
+        obj.add_range(u'o', u'r')
+
+        self.assertEqual(obj._len_cache, 'len')
+        self.assertFalse(mock_add_range.called)
+
+    @mock.patch.object(charset, '_add_range')
+    @mock.patch.object(charset, '_search_ranges', return_value=(1, True))
+    def test_add_range_overlap(self, mock_search_ranges, mock_add_range):
+        obj = charset.CharSet(None, [
+            charset.Range(97, 99),
+            charset.Range(110, 112),
+        ])
+        obj._len_cache = 'len'
+
+        obj.add_range(111, 115)
+
+        self.assertIsNone(obj._len_cache)
+        mock_search_ranges.assert_called_once_with(obj.ranges, 111)
+        mock_add_range.assert_called_once_with(
+            obj.ranges, 111, 115, (1, True))
+
+    def test_add_range_reversed(self):
+        obj = charset.CharSet()
+
+        self.assertRaises(ValueError, obj.add_range, u'z', u'a')
+        self.assertEqual(obj.ranges, [])
+
+    def test_add_range_invalid(self):
+        obj = charset.CharSet()
+
+        self.assertRaises(ValueError, obj.add_range, 97, charset.MAX_CHAR + 1)
+        self.assertEqual(obj.ranges, [])
+
     @mock.patch.object(charset, '_discard_range')
     @mock.patch.object(charset, '_search_ranges', return_value=(0, False))
     def test_discard_empty(self, mock_search_ranges, mock_discard_range):
@@ -2331,20 +3184,26 @@ class TestFrozenCharSet(unittest.TestCase):
                        return_value=mock.Mock(ranges='ranges'))
     def test_init_charset(self, mock_CharSet):
         obj = CharSetForTest('ranges')
+        obj._len_cache = 'len'
+        obj._latin1_cache = 'ascii'
+        obj._str_cache = 'str'
 
         result = charset.FrozenCharSet(obj)
 
         self.assertEqual(result.ranges, ('r', 'a', 'n', 'g', 'e', 's'))
+        self.assertEqual(result._len_cache, 'len')
+        self.assertEqual(result._latin1_cache, 'ascii')
+        self.assertEqual(result._str_cache, 'str')
         self.assertFalse(mock_CharSet.called)
 
-    @mock.patch.object(charset, 'CharSet',
-                       return_value=mock.Mock(ranges='ranges'))
-    def test_init_seq(self, mock_CharSet):
+    @mock.patch.object(charset, '_from_chars', return_value=['ranges'])
+    @mock.patch.object(charset, 'CharSet')
+    def test_init_seq(self, mock_CharSet, mock_from_chars):
         result = charset.FrozenCharSet([5, 10, 15])
 
-        # Since we mock out .add()
-        self.assertEqual(result.ranges, ('r', 'a', 'n', 'g', 'e', 's'))
-        mock_CharSet.assert_called_once_with([5, 10, 15], None)
+        self.assertEqual(result.ranges, ('ranges',))
+        mock_from_chars.assert_called_once_with([5, 10, 15])
+        self.assertFalse(mock_CharSet.called)
 
     def test_hash(self):
         obj = charset.FrozenCharSet(None, ('rng1', 'rng2', 'rng3'))
@@ -2352,3 +3211,56 @@ class TestFrozenCharSet(unittest.TestCase):
         result = obj.__hash__()
 
         self.assertEqual(result, hash(('rng1', 'rng2', 'rng3')))
+        self.assertEqual(obj._hash_cache, result)
+
+    def test_hash_cached(self):
+        obj = charset.FrozenCharSet(None, ('rng1', 'rng2', 'rng3'))
+        obj._hash_cache = 12345
+
+        result = obj.__hash__()
+
+        self.assertEqual(result, 12345)
+
+    @mock.patch.object(charset, '_frozen_cache',
+                       new_callable=charset.weakref.WeakValueDictionary)
+    def test_intern(self, mock_frozen_cache):
+        result1 = charset.FrozenCharSet.intern(u'a', u'z')
+        result2 = charset.FrozenCharSet.intern(97, 122)
+        result3 = charset.FrozenCharSet.intern(u'a', u'y')
+
+        self.assertIsInstance(result1, charset.FrozenCharSet)
+        self.assertEqual(result1.ranges, (charset.Range(97, 122),))
+        self.assertIs(result2, result1)
+        self.assertIsNot(result3, result1)
+        self.assertEqual(len(mock_frozen_cache), 2)
+
+    @mock.patch.object(charset, '_frozen_cache',
+                       new_callable=charset.weakref.WeakValueDictionary)
+    def test_intern_charset(self, mock_frozen_cache):
+        cset = charset.CharSet(u'a', u'z')
+
+        result1 = charset.FrozenCharSet.intern(cset)
+        result2 = charset.FrozenCharSet.intern(cset)
+
+        self.assertIsInstance(result1, charset.FrozenCharSet)
+        self.assertEqual(result1, cset)
+        self.assertIs(result2, result1)
+
+    @mock.patch.object(charset, '_frozen_cache',
+                       new_callable=charset.weakref.WeakValueDictionary)
+    def test_intern_frozen(self, mock_frozen_cache):
+        frozen1 = charset.FrozenCharSet(u'a', u'z')
+        frozen2 = charset.FrozenCharSet(u'a', u'z')
+
+        result1 = charset.FrozenCharSet.intern(frozen1)
+        result2 = charset.FrozenCharSet.intern(frozen2)
+
+        self.assertIs(result1, frozen1)
+        self.assertIs(result2, frozen1)
+
+    @mock.patch.object(charset, '_frozen_cache',
+                       new_callable=charset.weakref.WeakValueDictionary)
+    def test_intern_released(self, mock_frozen_cache):
+        charset.FrozenCharSet.intern(u'a', u'z')
+
+        self.assertEqual(len(mock_frozen_cache), 0)
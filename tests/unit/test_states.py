@@ -1,37 +1,10 @@
+import collections
 import unittest
 
 import mock
 
 from plexgen import states
-
-
-class TestAllEps(unittest.TestCase):
-    def test_empty(self):
-        result = states._all_eps({})
-
-        self.assertTrue(result)
-
-    def test_only_eps(self):
-        tab = {
-            0: set('spam'),
-            1: set(),
-            2: set(),
-        }
-
-        result = states._all_eps(tab)
-
-        self.assertTrue(result)
-
-    def test_more_than_eps(self):
-        tab = {
-            0: set('spam'),
-            1: set('spam'),
-            2: set('spam'),
-        }
-
-        result = states._all_eps(tab)
-
-        self.assertFalse(result)
+from plexgen import transitions
 
 
 class TestIterTrans(unittest.TestCase):
@@ -42,7 +15,7 @@ class TestIterTrans(unittest.TestCase):
             2: set(['2-0']),
         }
 
-        result = list(states._iter_trans(tab, None))
+        result = list(states._iter_trans(tab, None, (0, 1, 2)))
 
         self.assertEqual(set(result[:2]), set(['0-0', '0-1']))
         self.assertEqual(set(result[2:5]), set(['1-0', '1-1', '1-2']))
@@ -55,10 +28,20 @@ class TestIterTrans(unittest.TestCase):
             2: set(['2-0']),
         }
 
-        result = set(states._iter_trans(tab, 1))
+        result = set(states._iter_trans(tab, 1, (0, 1, 2)))
 
         self.assertEqual(result, set(['1-0', '1-1', '1-2']))
 
+    def test_prio_missing(self):
+        tab = {
+            0: set(['0-0', '0-1']),
+        }
+
+        result = list(states._iter_trans(tab, 1, (0,)))
+
+        self.assertEqual(result, [])
+        self.assertEqual(tab, {0: set(['0-0', '0-1'])})
+
 
 class TestEpsClosure(unittest.TestCase):
     def test_base(self):
@@ -71,9 +54,11 @@ class TestEpsClosure(unittest.TestCase):
             'st6': ['st1', 'st7'],
         }
         for st_name, state in tstates.items():
-            state.iter_out.return_value = [
-                mock.Mock(state_in=tstates[t]) for t in trans.get(st_name, ())
-            ]
+            state._trans_out = {
+                0: [mock.Mock(state_in=tstates[t])
+                    for t in trans.get(st_name, ())],
+                1: [mock.Mock(state_in=tstates['st6'])],
+            }
 
         result = states.eps_closure(set([tstates['st0'], tstates['st3']]))
 
@@ -84,6 +69,104 @@ class TestEpsClosure(unittest.TestCase):
         )
         self.assertIsInstance(result, frozenset)
 
+    def test_iterator(self):
+        st0 = mock.Mock()
+        st1 = mock.Mock(_trans_out={})
+        st0._trans_out = {0: [mock.Mock(state_in=st1)]}
+
+        result = states.eps_closure(iter([st0]))
+
+        self.assertEqual(result, frozenset([st0, st1]))
+
+    def test_visit_once(self):
+        # A diamond: st0 reaches st3 through both st1 and st2
+        tstates = [mock.Mock() for i in range(4)]
+        trans = {0: [1, 2], 1: [3], 2: [3], 3: [0]}
+        for i, state in enumerate(tstates):
+            state._trans_out = mock.Mock(**{'get.return_value': [
+                mock.Mock(state_in=tstates[t]) for t in trans[i]
+            ]})
+
+        result = states.eps_closure([tstates[0]])
+
+        self.assertEqual(result, frozenset(tstates))
+        for state in tstates:
+            state._trans_out.get.assert_called_once_with(0, ())
+
+    def test_known(self):
+        # st0 -> st1 -> st2 -> st3, with st2's closure already known
+        tstates = [mock.Mock() for i in range(4)]
+        trans = {0: [1], 1: [2], 2: [3], 3: []}
+        for i, state in enumerate(tstates):
+            state._trans_out = mock.Mock(**{'get.return_value': [
+                mock.Mock(state_in=tstates[t]) for t in trans[i]
+            ]})
+        known = {tstates[2]: frozenset(tstates[2:])}
+
+        result = states.eps_closure([tstates[0]], known)
+
+        self.assertEqual(result, frozenset(tstates))
+        tstates[0]._trans_out.get.assert_called_once_with(0, ())
+        tstates[1]._trans_out.get.assert_called_once_with(0, ())
+        self.assertFalse(tstates[2]._trans_out.get.called)
+        self.assertFalse(tstates[3]._trans_out.get.called)
+
+
+class TestEpsClosures(unittest.TestCase):
+    def make_states(self, trans):
+        tstates = [states.State() for i in range(len(trans))]
+        for i, targets in trans.items():
+            for t in targets:
+                tstates[i]._link(transitions.Epsilon(tstates[i], tstates[t]))
+        return tstates
+
+    def test_chain(self):
+        tstates = self.make_states({0: [1], 1: [2], 2: []})
+
+        result = states.eps_closures([tstates[0]])
+
+        self.assertEqual(result, {
+            tstates[0]: frozenset(tstates),
+            tstates[1]: frozenset(tstates[1:]),
+            tstates[2]: frozenset(tstates[2:]),
+        })
+
+    def test_cycle(self):
+        # st1 and st2 form a cycle, which leads on to st3
+        tstates = self.make_states({
+            0: [1], 1: [2], 2: [1, 3], 3: [],
+        })
+
+        result = states.eps_closures([tstates[0]])
+
+        self.assertEqual(result, {
+            tstates[0]: frozenset(tstates),
+            tstates[1]: frozenset(tstates[1:]),
+            tstates[2]: frozenset(tstates[1:]),
+            tstates[3]: frozenset(tstates[3:]),
+        })
+        self.assertIs(result[tstates[1]], result[tstates[2]])
+
+    def test_ignores_other_transitions(self):
+        tstates = self.make_states({0: [], 1: []})
+        tstates[0]._link(transitions.MatchChar(
+            tstates[0], tstates[1], cset=transitions.charset.CharSet('a')))
+
+        result = states.eps_closures([tstates[0]])
+
+        self.assertEqual(result, {tstates[0]: frozenset(tstates[:1])})
+
+    def test_known(self):
+        tstates = self.make_states({0: [1], 1: [2], 2: [3], 3: []})
+        known = {tstates[2]: frozenset(tstates[2:])}
+
+        result = states.eps_closures([tstates[0], tstates[2]], known)
+
+        self.assertEqual(result, {
+            tstates[0]: frozenset(tstates),
+            tstates[1]: frozenset(tstates[1:]),
+        })
+
 
 class TestState(unittest.TestCase):
     def test_init_base(self):
@@ -94,8 +177,19 @@ class TestState(unittest.TestCase):
         self.assertIsNone(result.name)
         self.assertEqual(result._trans_in, {})
         self.assertEqual(result._trans_out, {})
-        self.assertIsNone(result._eps_in)
-        self.assertIsNone(result._eps_out)
+        self.assertEqual(result._in_prios, ())
+        self.assertEqual(result._out_prios, ())
+        self.assertEqual(result._in_by_cls, {})
+        self.assertEqual(result._out_by_cls, {})
+        self.assertEqual(result._in_by_source, {})
+        self.assertEqual(result._out_by_target, {})
+        self.assertEqual(result._noneps_in, 0)
+        self.assertEqual(result._noneps_out, 0)
+        for attr in ('_in_by_cls', '_out_by_cls', '_in_by_source',
+                     '_out_by_target'):
+            self.assertIsInstance(getattr(result, attr),
+                                  collections.defaultdict)
+            self.assertIs(getattr(result, attr).default_factory, set)
 
     def test_init_accepting(self):
         result = states.State('accepting', 'code')
@@ -105,8 +199,19 @@ class TestState(unittest.TestCase):
         self.assertIsNone(result.name)
         self.assertEqual(result._trans_in, {})
         self.assertEqual(result._trans_out, {})
-        self.assertIsNone(result._eps_in)
-        self.assertIsNone(result._eps_out)
+        self.assertEqual(result._in_prios, ())
+        self.assertEqual(result._out_prios, ())
+        self.assertEqual(result._in_by_cls, {})
+        self.assertEqual(result._out_by_cls, {})
+        self.assertEqual(result._in_by_source, {})
+        self.assertEqual(result._out_by_target, {})
+        self.assertEqual(result._noneps_in, 0)
+        self.assertEqual(result._noneps_out, 0)
+
+    def test_slots(self):
+        result = states.State()
+
+        self.assertFalse(hasattr(result, '__dict__'))
 
     def test_hashable(self):
         obj1 = states.State()
@@ -122,11 +227,27 @@ class TestState(unittest.TestCase):
         obj = states.State()
         obj._trans_in = 'in'
         obj._trans_out = 'out'
+        obj._in_prios = 'prios_in'
+        obj._out_prios = 'prios_out'
+        obj._in_by_cls = 'cls_in'
+        obj._out_by_cls = 'cls_out'
+        obj._in_by_source = 'source_in'
+        obj._out_by_target = 'target_out'
+        obj._noneps_in = 1
+        obj._noneps_out = 2
 
         obj.reverse()
 
         self.assertEqual(obj._trans_in, 'out')
         self.assertEqual(obj._trans_out, 'in')
+        self.assertEqual(obj._in_prios, 'prios_out')
+        self.assertEqual(obj._out_prios, 'prios_in')
+        self.assertEqual(obj._in_by_cls, 'cls_out')
+        self.assertEqual(obj._out_by_cls, 'cls_in')
+        self.assertEqual(obj._in_by_source, 'target_out')
+        self.assertEqual(obj._out_by_target, 'source_in')
+        self.assertEqual(obj._noneps_in, 2)
+        self.assertEqual(obj._noneps_out, 1)
 
     def test_transition_empty(self):
         class Trans1(object):
@@ -140,6 +261,7 @@ class TestState(unittest.TestCase):
         trans_class = mock.Mock(return_value=trans)
         st_from = states.State()
         st_to = states.State()
+        trans.state_in = st_to
 
         st_from.transition(trans_class, st_to, a=1, b=2, c=3)
 
@@ -147,6 +269,16 @@ class TestState(unittest.TestCase):
         trans.merge.assert_called_once_with(set())
         self.assertEqual(st_from._trans_out, {1: set([trans])})
         self.assertEqual(st_to._trans_in, {1: set([trans])})
+        self.assertEqual(st_from._out_prios, (1,))
+        self.assertEqual(st_to._in_prios, (1,))
+        self.assertEqual(st_from._out_by_cls, {Trans1: set([trans])})
+        self.assertEqual(st_to._in_by_cls, {Trans1: set([trans])})
+        self.assertEqual(st_from._out_by_target,
+                         {(st_to, Trans1): set([trans])})
+        self.assertEqual(st_to._in_by_source,
+                         {(st_from, Trans1): set([trans])})
+        self.assertEqual(st_from._noneps_out, 1)
+        self.assertEqual(st_to._noneps_in, 1)
 
     def test_transition_nomerge(self):
         class Trans1(object):
@@ -163,33 +295,56 @@ class TestState(unittest.TestCase):
         trans_class = mock.Mock(return_value=trans)
         st_from = states.State()
         st_to = states.State()
+        trans.state_in = st_to
         others = set([
             mock.Mock(__class__=Trans1, state_in=st_to),
             mock.Mock(__class__=Trans1, state_in=st_to),
             mock.Mock(__class__=Trans1, state_in=st_to),
         ])
-        from_out = set([
+        from_out_list = [
             mock.Mock(__class__=Trans1, state_in='st1'),
             mock.Mock(__class__=Trans1, state_in='st2'),
             mock.Mock(__class__=Trans1, state_in='st3'),
             mock.Mock(__class__=Trans2, state_in=st_to),
             mock.Mock(__class__=Trans2, state_in=st_to),
-        ])
+        ]
+        from_out = set(from_out_list)
         st_from._trans_out = {
             0: set([0, 1, 2]),
             1: from_out | others,
             2: set([3, 4, 5]),
         }
-        to_in = set([
+        to_in_list = [
             mock.Mock(__class__=Trans1),
             mock.Mock(__class__=Trans2),
             mock.Mock(__class__=Trans1),
-        ])
+        ]
+        to_in = set(to_in_list)
         st_to._trans_in = {
             0: set([6, 7, 8]),
             1: to_in | others,
             2: set([9, 10, 11]),
         }
+        st_from._out_by_cls = {
+            Trans1: set(from_out_list[:3]) | others,
+            Trans2: set(from_out_list[3:]),
+        }
+        st_to._in_by_cls = {
+            Trans1: set(to_in_list[::2]) | others,
+            Trans2: set(to_in_list[1:2]),
+        }
+        st_from._out_by_target = {
+            ('st1', Trans1): set(from_out_list[:1]),
+            (st_to, Trans1): set(others),
+            (st_to, Trans2): set(from_out_list[3:]),
+        }
+        st_to._in_by_source = {
+            ('st4', Trans1): set(to_in_list[::2]),
+            (st_from, Trans1): set(others),
+            ('st4', Trans2): set(to_in_list[1:2]),
+        }
+        st_from._noneps_out = 8
+        st_to._noneps_in = 6
 
         st_from.transition(trans_class, st_to, a=1, b=2, c=3)
 
@@ -205,6 +360,26 @@ class TestState(unittest.TestCase):
             1: to_in | others | set([trans]),
             2: set([9, 10, 11]),
         })
+        self.assertEqual(st_from._out_by_cls, {
+            Trans1: set(from_out_list[:3]) | others | set([trans]),
+            Trans2: set(from_out_list[3:]),
+        })
+        self.assertEqual(st_to._in_by_cls, {
+            Trans1: set(to_in_list[::2]) | others | set([trans]),
+            Trans2: set(to_in_list[1:2]),
+        })
+        self.assertEqual(st_from._out_by_target, {
+            ('st1', Trans1): set(from_out_list[:1]),
+            (st_to, Trans1): others | set([trans]),
+            (st_to, Trans2): set(from_out_list[3:]),
+        })
+        self.assertEqual(st_to._in_by_source, {
+            ('st4', Trans1): set(to_in_list[::2]),
+            (st_from, Trans1): others | set([trans]),
+            ('st4', Trans2): set(to_in_list[1:2]),
+        })
+        self.assertEqual(st_from._noneps_out, 9)
+        self.assertEqual(st_to._noneps_in, 7)
 
     def test_transition_merge(self):
         class Trans1(object):
@@ -221,33 +396,56 @@ class TestState(unittest.TestCase):
         trans_class = mock.Mock(return_value=trans)
         st_from = states.State()
         st_to = states.State()
+        trans.state_in = st_to
         others = set([
             mock.Mock(__class__=Trans1, state_in=st_to),
             mock.Mock(__class__=Trans1, state_in=st_to),
             mock.Mock(__class__=Trans1, state_in=st_to),
         ])
-        from_out = set([
+        from_out_list = [
             mock.Mock(__class__=Trans1, state_in='st1'),
             mock.Mock(__class__=Trans1, state_in='st2'),
             mock.Mock(__class__=Trans1, state_in='st3'),
             mock.Mock(__class__=Trans2, state_in=st_to),
             mock.Mock(__class__=Trans2, state_in=st_to),
-        ])
+        ]
+        from_out = set(from_out_list)
         st_from._trans_out = {
             0: set([0, 1, 2]),
             1: from_out | others,
             2: set([3, 4, 5]),
         }
-        to_in = set([
+        to_in_list = [
             mock.Mock(__class__=Trans1),
             mock.Mock(__class__=Trans2),
             mock.Mock(__class__=Trans1),
-        ])
+        ]
+        to_in = set(to_in_list)
         st_to._trans_in = {
             0: set([6, 7, 8]),
             1: to_in | others,
             2: set([9, 10, 11]),
         }
+        st_from._out_by_cls = {
+            Trans1: set(from_out_list[:3]) | others,
+            Trans2: set(from_out_list[3:]),
+        }
+        st_to._in_by_cls = {
+            Trans1: set(to_in_list[::2]) | others,
+            Trans2: set(to_in_list[1:2]),
+        }
+        st_from._out_by_target = {
+            ('st1', Trans1): set(from_out_list[:1]),
+            (st_to, Trans1): set(others),
+            (st_to, Trans2): set(from_out_list[3:]),
+        }
+        st_to._in_by_source = {
+            ('st4', Trans1): set(to_in_list[::2]),
+            (st_from, Trans1): set(others),
+            ('st4', Trans2): set(to_in_list[1:2]),
+        }
+        st_from._noneps_out = 8
+        st_to._noneps_in = 6
 
         st_from.transition(trans_class, st_to, a=1, b=2, c=3)
 
@@ -263,81 +461,313 @@ class TestState(unittest.TestCase):
             1: to_in | set([12, 13, 14]),
             2: set([9, 10, 11]),
         })
+        self.assertEqual(st_from._out_by_cls, {
+            Trans1: set(from_out_list[:3]) | set([12, 13, 14]),
+            Trans2: set(from_out_list[3:]),
+        })
+        self.assertEqual(st_to._in_by_cls, {
+            Trans1: set(to_in_list[::2]) | set([12, 13, 14]),
+            Trans2: set(to_in_list[1:2]),
+        })
+        self.assertEqual(st_from._out_by_target, {
+            ('st1', Trans1): set(from_out_list[:1]),
+            (st_to, Trans1): set([12, 13, 14]),
+            (st_to, Trans2): set(from_out_list[3:]),
+        })
+        self.assertEqual(st_to._in_by_source, {
+            ('st4', Trans1): set(to_in_list[::2]),
+            (st_from, Trans1): set([12, 13, 14]),
+            ('st4', Trans2): set(to_in_list[1:2]),
+        })
+        self.assertEqual(st_from._noneps_out, 8)
+        self.assertEqual(st_to._noneps_in, 6)
+
+    def test_transition_absorbed(self):
+        class Trans1(object):
+            pass
+
+        st_from = states.State()
+        st_to = states.State()
+        other = mock.Mock(__class__=Trans1, state_in=st_to, priority=1)
+        st_from._link(other)
+        trans = mock.Mock(**{
+            '__class__': Trans1,
+            'priority': 1,
+            'merge.return_value': set([other]),
+        })
+        trans_class = mock.Mock(return_value=trans)
+        trans.state_in = st_to
+
+        st_from.transition(trans_class, st_to)
+
+        trans.merge.assert_called_once_with(set([other]))
+        self.assertEqual(st_from._trans_out, {1: set([other])})
+        self.assertEqual(st_to._trans_in, {1: set([other])})
+        self.assertEqual(st_from._out_by_cls, {Trans1: set([other])})
+        self.assertEqual(st_to._in_by_cls, {Trans1: set([other])})
+        self.assertEqual(st_from._out_by_target,
+                         {(st_to, Trans1): set([other])})
+        self.assertEqual(st_to._in_by_source,
+                         {(st_from, Trans1): set([other])})
+        self.assertEqual(st_from._noneps_out, 1)
+        self.assertEqual(st_to._noneps_in, 1)
+
+    def test_add_transition(self):
+        st_from = states.State()
+        st_to = states.State()
+        trans = transitions.MatchChar(st_from, st_to,
+                                      cset=transitions.charset.CharSet('a'))
+        other = transitions.MatchChar(st_from, st_to,
+                                      cset=transitions.charset.CharSet('b'))
+
+        st_from._add_transition(trans)
+        st_from._add_transition(other)
+
+        result = list(st_from.iter_out())
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].cset, transitions.charset.CharSet('a', 'b'))
+        self.assertEqual(list(st_to.iter_in()), result)
+        self.assertEqual(st_from._noneps_out, 1)
+        self.assertEqual(st_to._noneps_in, 1)
+
+    def test_epsilon_to(self):
+        st_from = states.State()
+        st_to = states.State()
+
+        st_from.epsilon_to(st_to)
+
+        result = list(st_from.iter_out())
+        self.assertEqual(len(result), 1)
+        self.assertIsInstance(result[0], transitions.Epsilon)
+        self.assertIs(result[0].state_out, st_from)
+        self.assertIs(result[0].state_in, st_to)
+        self.assertEqual(list(st_to.iter_in()), result)
+        self.assertEqual(st_from._out_prios, (0,))
+        self.assertEqual(st_to._in_prios, (0,))
+        self.assertEqual(st_from._noneps_out, 0)
+        self.assertEqual(st_to._noneps_in, 0)
+
+    def test_epsilon_to_exists(self):
+        st_from = states.State()
+        st_to = states.State()
+        st_from.epsilon_to(st_to)
+        existing = list(st_from.iter_out())
+
+        st_from.epsilon_to(st_to)
+
+        self.assertEqual(list(st_from.iter_out()), existing)
+        self.assertEqual(list(st_to.iter_in()), existing)
+
+    def test_transitions(self):
+        st_from = states.State()
+        st_to = states.State()
+
+        st_from.transitions(transitions.MatchChar, st_to, [
+            {'cset': transitions.charset.CharSet('a')},
+            {'cset': transitions.charset.CharSet('b')},
+            {'cset': transitions.charset.CharSet('c')},
+        ])
+
+        result = list(st_from.iter_out())
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].cset,
+                         transitions.charset.CharSet('a', 'c'))
+        self.assertEqual(list(st_to.iter_in()), result)
+        self.assertEqual(st_from._out_by_target,
+                         {(st_to, transitions.MatchChar): set(result)})
+        self.assertEqual(st_to._in_by_source,
+                         {(st_from, transitions.MatchChar): set(result)})
+        self.assertEqual(st_from._noneps_out, 1)
+        self.assertEqual(st_to._noneps_in, 1)
+
+    def test_transitions_nomerge(self):
+        class Trans1(object):
+            pass
+
+        st_from = states.State()
+        st_to = states.State()
+        trans_list = [
+            mock.Mock(**{
+                '__class__': Trans1,
+                'priority': 2,
+                'merge.return_value': None,
+            })
+            for i in range(3)
+        ]
+        trans_class = mock.Mock(side_effect=trans_list)
+
+        st_from.transitions(trans_class, st_to, [{'a': 1}, {'a': 2}, {}])
+
+        trans_class.assert_has_calls([
+            mock.call(st_from, st_to, a=1),
+            mock.call(st_from, st_to, a=2),
+            mock.call(st_from, st_to),
+        ])
+        trans_list[0].merge.assert_called_once_with(set())
+        trans_list[1].merge.assert_called_once_with(set(trans_list[:1]))
+        trans_list[2].merge.assert_called_once_with(set(trans_list[:2]))
+        self.assertEqual(st_from._trans_out, {2: set(trans_list)})
+        self.assertEqual(st_to._trans_in, {2: set(trans_list)})
+        self.assertEqual(st_from._out_by_cls, {Trans1: set(trans_list)})
+        self.assertEqual(st_to._in_by_cls, {Trans1: set(trans_list)})
+        self.assertEqual(st_from._noneps_out, 3)
+        self.assertEqual(st_to._noneps_in, 3)
+
+    def test_transitions_empty(self):
+        trans_class = mock.Mock()
+        st_from = states.State()
+        st_to = states.State()
+
+        st_from.transitions(trans_class, st_to, [])
+
+        self.assertFalse(trans_class.called)
+        self.assertEqual(st_from._trans_out, {})
+        self.assertEqual(st_to._trans_in, {})
+        self.assertEqual(st_from._out_by_cls, {})
+        self.assertEqual(st_to._in_by_cls, {})
+
+    def test_in_bucket(self):
+        obj = states.State()
+        obj._trans_in = {2: set(['t2'])}
+        obj._in_prios = (2,)
+
+        result1 = obj._in_bucket(2)
+        result2 = obj._in_bucket(0)
+
+        self.assertEqual(result1, set(['t2']))
+        self.assertEqual(result2, set())
+        self.assertIs(obj._trans_in[0], result2)
+        self.assertEqual(obj._in_prios, (0, 2))
+
+    def test_out_bucket(self):
+        obj = states.State()
+        obj._trans_out = {0: set(['t0'])}
+        obj._out_prios = (0,)
+
+        result1 = obj._out_bucket(0)
+        result2 = obj._out_bucket(1)
+
+        self.assertEqual(result1, set(['t0']))
+        self.assertEqual(result2, set())
+        self.assertIs(obj._trans_out[1], result2)
+        self.assertEqual(obj._out_prios, (0, 1))
+
+    def test_link(self):
+        class Trans1(object):
+            pass
+
+        st_from = states.State()
+        st_to = states.State()
+        other = mock.Mock(__class__=Trans1, priority=1)
+        st_from._trans_out = {1: set([other])}
+        st_from._out_by_cls = {Trans1: set([other])}
+        trans = mock.Mock(__class__=Trans1, state_out=st_from,
+                          state_in=st_to, priority=1)
+
+        st_from._link(trans)
+
+        self.assertEqual(st_from._trans_out, {1: set([other, trans])})
+        self.assertEqual(st_to._trans_in, {1: set([trans])})
+        self.assertEqual(st_from._out_by_cls, {Trans1: set([other, trans])})
+        self.assertEqual(st_to._in_by_cls, {Trans1: set([trans])})
+        self.assertEqual(st_from._out_by_target,
+                         {(st_to, Trans1): set([trans])})
+        self.assertEqual(st_to._in_by_source,
+                         {(st_from, Trans1): set([trans])})
+        self.assertEqual(st_from._noneps_out, 1)
+        self.assertEqual(st_to._noneps_in, 1)
 
     @mock.patch.object(states, '_iter_trans')
     def test_iter_in_base(self, mock_iter_trans):
         obj = states.State()
         obj._trans_in = 'in'
+        obj._in_prios = 'prios'
 
         result = obj.iter_in()
 
         self.assertEqual(result, mock_iter_trans.return_value)
-        mock_iter_trans.assert_called_once_with('in', None)
+        mock_iter_trans.assert_called_once_with('in', None, 'prios')
 
     @mock.patch.object(states, '_iter_trans')
     def test_iter_in_prio(self, mock_iter_trans):
         obj = states.State()
         obj._trans_in = 'in'
+        obj._in_prios = 'prios'
 
         result = obj.iter_in(2)
 
         self.assertEqual(result, mock_iter_trans.return_value)
-        mock_iter_trans.assert_called_once_with('in', 2)
+        mock_iter_trans.assert_called_once_with('in', 2, 'prios')
 
     @mock.patch.object(states, '_iter_trans')
     def test_iter_out_base(self, mock_iter_trans):
         obj = states.State()
         obj._trans_out = 'out'
+        obj._out_prios = 'prios'
 
         result = obj.iter_out()
 
         self.assertEqual(result, mock_iter_trans.return_value)
-        mock_iter_trans.assert_called_once_with('out', None)
+        mock_iter_trans.assert_called_once_with('out', None, 'prios')
 
     @mock.patch.object(states, '_iter_trans')
     def test_iter_out_prio(self, mock_iter_trans):
         obj = states.State()
         obj._trans_out = 'out'
+        obj._out_prios = 'prios'
 
         result = obj.iter_out(2)
 
         self.assertEqual(result, mock_iter_trans.return_value)
-        mock_iter_trans.assert_called_once_with('out', 2)
+        mock_iter_trans.assert_called_once_with('out', 2, 'prios')
 
-    @mock.patch.object(states, '_all_eps', return_value='uncached')
-    def test_eps_in_cached(self, mock_all_eps):
+    def test_iter_out_by_cls(self):
         obj = states.State()
-        obj._trans_in = 'in'
-        obj._eps_in = 'cached'
+        obj._out_by_cls = {'cls1': 'trans1', 'cls2': 'trans2'}
+
+        result = obj.iter_out_by_cls()
 
-        self.assertEqual(obj.eps_in, 'cached')
-        self.assertEqual(obj._eps_in, 'cached')
-        self.assertFalse(mock_all_eps.called)
+        self.assertEqual(sorted(result), [
+            ('cls1', 'trans1'),
+            ('cls2', 'trans2'),
+        ])
 
-    @mock.patch.object(states, '_all_eps', return_value='uncached')
-    def test_eps_in_uncached(self, mock_all_eps):
+    def test_eps_in_true(self):
         obj = states.State()
-        obj._trans_in = 'in'
 
-        self.assertEqual(obj.eps_in, 'uncached')
-        self.assertEqual(obj._eps_in, 'uncached')
-        mock_all_eps.assert_called_once_with('in')
+        self.assertTrue(obj.eps_in)
 
-    @mock.patch.object(states, '_all_eps', return_value='uncached')
-    def test_eps_out_cached(self, mock_all_eps):
+    def test_eps_in_false(self):
         obj = states.State()
-        obj._trans_out = 'out'
-        obj._eps_out = 'cached'
+        obj._noneps_in = 2
 
-        self.assertEqual(obj.eps_out, 'cached')
-        self.assertEqual(obj._eps_out, 'cached')
-        self.assertFalse(mock_all_eps.called)
+        self.assertFalse(obj.eps_in)
 
-    @mock.patch.object(states, '_all_eps', return_value='uncached')
-    def test_eps_out_uncached(self, mock_all_eps):
+    def test_eps_out_true(self):
         obj = states.State()
-        obj._trans_out = 'out'
 
-        self.assertEqual(obj.eps_out, 'uncached')
-        self.assertEqual(obj._eps_out, 'uncached')
-        mock_all_eps.assert_called_once_with('out')
+        self.assertTrue(obj.eps_out)
+
+    def test_eps_out_false(self):
+        obj = states.State()
+        obj._noneps_out = 2
+
+        self.assertFalse(obj.eps_out)
+
+    def test_eps_counts(self):
+        class Trans1(object):
+            pass
+
+        st_from = states.State()
+        st_to = states.State()
+        eps = mock.Mock(**{
+            '__class__': Trans1,
+            'priority': 0,
+            'merge.return_value': None,
+            'state_in': st_to,
+        })
+
+        st_from.transition(mock.Mock(return_value=eps), st_to)
+
+        self.assertTrue(st_from.eps_out)
+        self.assertTrue(st_to.eps_in)
@@ -32,14 +32,14 @@ class TestTransition(unittest.TestCase):
 
         self.assertEqual(result.state_out, 'out')
         self.assertEqual(result.state_in, 'in')
-        self.assertEqual(result.args, {'a': 1, 'b': 2, 'c': 42})
+        self.assertEqual((result.a, result.b, result.c), (1, 2, 42))
 
     def test_init_default_override(self):
         result = TransitionForTest('out', 'in', a=1, b=2, c=3)
 
         self.assertEqual(result.state_out, 'out')
         self.assertEqual(result.state_in, 'in')
-        self.assertEqual(result.args, {'a': 1, 'b': 2, 'c': '3'})
+        self.assertEqual((result.a, result.b, result.c), (1, 2, '3'))
 
     def test_init_missing(self):
         self.assertRaises(TypeError, TransitionForTest,
@@ -62,6 +62,8 @@ class TestTransition(unittest.TestCase):
     def test_getattr_exists(self):
         obj = TransitionForTest('out', 'in', a=1, b=2)
 
+        self.assertEqual(obj.a, 1)
+        self.assertEqual(obj.b, 2)
         self.assertEqual(obj.c, 42)
 
     def test_getattr_missing(self):
@@ -69,6 +71,19 @@ class TestTransition(unittest.TestCase):
 
         self.assertRaises(AttributeError, lambda: obj.d)
 
+    def test_copy(self):
+        obj = TransitionForTest('out', 'in', a=1, b=2)
+
+        result = obj.copy('new_out', 'new_in')
+
+        self.assertIsInstance(result, TransitionForTest)
+        self.assertIsNot(result, obj)
+        self.assertEqual(result.state_out, 'new_out')
+        self.assertEqual(result.state_in, 'new_in')
+        self.assertEqual((result.a, result.b, result.c), (1, 2, 42))
+        self.assertEqual(obj.state_out, 'out')
+        self.assertEqual(obj.state_in, 'in')
+
     def test_reverse(self):
         obj = TransitionForTest('out', 'in', a=1, b=2)
 
@@ -78,6 +93,25 @@ class TestTransition(unittest.TestCase):
         self.assertEqual(obj.state_in, 'out')
 
 
+class TestSlots(unittest.TestCase):
+    def test_epsilon(self):
+        result = transitions.Epsilon('out', 'in')
+
+        self.assertFalse(hasattr(result, '__dict__'))
+
+    def test_match_char(self):
+        result = transitions.MatchChar('out', 'in',
+                                       cset=transitions.charset.CharSet('a'))
+
+        self.assertFalse(hasattr(result, '__dict__'))
+
+    def test_action(self):
+        result = transitions.Action('out', 'in', action='action',
+                                    precedence=1)
+
+        self.assertFalse(hasattr(result, '__dict__'))
+
+
 class TestEpsilon(unittest.TestCase):
     def test_disjoint(self):
         result = transitions.Epsilon.disjoint(['t1', 't2', 't3'])
@@ -99,8 +133,8 @@ class TestEpsilon(unittest.TestCase):
 
 class TestMatchChar(unittest.TestCase):
     @mock.patch.dict(transitions.MatchChar.xforms, clear=True)
-    @mock.patch.object(transitions.charset.CharSet, 'disjoint')
-    def test_disjoint(self, mock_disjoint):
+    @mock.patch.object(transitions.charset.CharSet, 'disjoint_indexes')
+    def test_disjoint(self, mock_disjoint_indexes):
         csets = {
             'dj1': mock.Mock(),
             'dj2': mock.Mock(),
@@ -118,10 +152,10 @@ class TestMatchChar(unittest.TestCase):
             transitions.MatchChar('t4_out', 't4_in', cset=csets['t4']),
             transitions.MatchChar('t5_out', 't5_in', cset=csets['t5']),
         ]
-        mock_disjoint.return_value = [
-            (csets['dj1'], [csets['t1'], csets['t2']]),
-            (csets['dj2'], [csets['t2']]),
-            (csets['dj3'], [csets['t3'], csets['t4'], csets['t5']]),
+        mock_disjoint_indexes.return_value = [
+            (csets['dj1'], [0, 1]),
+            (csets['dj2'], [1]),
+            (csets['dj3'], [2, 3, 4]),
         ]
         expected = [
             [
@@ -144,6 +178,69 @@ class TestMatchChar(unittest.TestCase):
                 self.assertEqual(exp.state_out, act.state_out)
                 self.assertEqual(exp.state_in, act.state_in)
                 self.assertEqual(exp.cset, act.cset)
+        mock_disjoint_indexes.assert_called_once_with(
+            csets['t1'], csets['t2'], csets['t3'], csets['t4'], csets['t5'])
+
+    def test_disjoint_shared_cset(self):
+        cset = transitions.charset.CharSet('a')
+        trans = [
+            transitions.MatchChar('out', 't1_in', cset=cset),
+            transitions.MatchChar('out', 't2_in', cset=cset),
+        ]
+        self.assertIs(trans[0].cset, trans[1].cset)
+
+        result = list(transitions.MatchChar.disjoint(trans))
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual([(t.state_in, t.cset) for t in result[0]], [
+            ('t1_in', cset),
+            ('t2_in', cset),
+        ])
+
+    @mock.patch.object(transitions.charset.CharSet, 'disjoint_indexes')
+    def test_disjoint_single(self, mock_disjoint_indexes):
+        trans = [transitions.MatchChar('out', 'in', cset=set('abc'))]
+
+        result = list(transitions.MatchChar.disjoint(trans))
+
+        self.assertEqual(result, [trans])
+        self.assertFalse(mock_disjoint_indexes.called)
+
+    def test_disjoint_grouped(self):
+        trans = [
+            transitions.MatchChar('t1_out', 't1_in',
+                                  cset=transitions.charset.CharSet('a', 'z')),
+            transitions.MatchChar('t2_out', 't2_in',
+                                  cset=transitions.charset.CharSet('m', 'n')),
+            transitions.MatchChar('t3_out', 't3_in',
+                                  cset=transitions.charset.CharSet('q')),
+        ]
+
+        expected = (transitions.charset.CharSet('a', 'l') |
+                    transitions.charset.CharSet('o', 'p') |
+                    transitions.charset.CharSet('r', 'z'))
+
+        result = list(transitions.MatchChar.disjoint(trans))
+
+        self.assertEqual(len(result), 3)
+        self.assertEqual([(t.state_in, t.cset) for t in result[0]], [
+            ('t1_in', expected),
+        ])
+        self.assertEqual([(t.state_in, t.cset) for t in result[1]], [
+            ('t1_in', transitions.charset.CharSet('m', 'n')),
+            ('t2_in', transitions.charset.CharSet('m', 'n')),
+        ])
+        self.assertEqual([(t.state_in, t.cset) for t in result[2]], [
+            ('t1_in', transitions.charset.CharSet('q')),
+            ('t3_in', transitions.charset.CharSet('q')),
+        ])
+
+    def test_slots(self):
+        obj = transitions.MatchChar('out', 'in',
+                                    cset=transitions.charset.CharSet('a'))
+
+        self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertEqual(obj.cset, transitions.charset.CharSet('a'))
 
     def test_match_end(self):
         obj = transitions.MatchChar('out', 'in', cset=set('abc'))
@@ -187,10 +284,19 @@ class TestMatchChar(unittest.TestCase):
         result_obj = list(result)[0]
         self.assertIsInstance(result_obj, transitions.MatchChar)
         self.assertNotEqual(result_obj, obj)
+        self.assertEqual(result_obj.state_out, 'out')
+        self.assertEqual(result_obj.state_in, 'in')
         self.assertEqual(result_obj.cset, set('abcdefg'))
 
 
 class TestAction(unittest.TestCase):
+    def test_slots(self):
+        obj = transitions.Action('out', 'in', action='action', precedence=1)
+
+        self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertEqual((obj.action, obj.precedence, obj.name),
+                         ('action', 1, None))
+
     def test_disjoint(self):
         result = transitions.Action.disjoint(['t1', 't2', 't3'])
 